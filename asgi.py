@@ -0,0 +1,264 @@
+"""
+ASGI entry point. /predict and /predict/stream run natively on the event
+loop with the async Gemini client, so one worker can wait on hundreds of
+Gemini calls at once. Every other route is served by the Flask app in
+main.py (WsgiToAsgi runs those one at a time per worker).
+
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import asyncio
+import json
+from contextlib import aclosing
+
+from asgiref.wsgi import WsgiToAsgi
+
+import main
+from src.admission import Overloaded
+
+try:
+    from src.gemini_brain import acall_gemini, aclose_async_client, astream_gemini
+except ImportError:
+    acall_gemini = None
+    aclose_async_client = None
+    astream_gemini = None
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+flask_app = WsgiToAsgi(main.app)
+
+
+async def predict(parsed, forwarded_for=None, client_addr=None):
+    """Async twin of main.predict (parsed = main.parse_request of the body)."""
+    user_text, mode, user_data, image_data, session_id = parsed
+    if main.rate_limiter is not None:
+        main.rate_limiter.check(main.client_key(user_data, forwarded_for, client_addr))
+
+    response_text = ""
+    history = main.session_store.history(session_id, main.SESSION_GEMINI_TOKEN_BUDGET)
+
+    cache_key, cached = main.cache_lookup(user_text, mode, user_data, image_data, history)
+    if cached is not None:
+        main.remember(session_id, user_text, cached)
+        return {'response': cached}
+
+    use_gemini = main.route(mode, image_data)
+
+    if use_gemini:
+        print(f"✨ Routing '{mode}' to Gemini...")
+        async with main.gemini_gate:
+            result = await acall_gemini(user_text, mode, user_data, image_data, history)
+
+        if result.ok:
+            response_text = result.text
+            main.cache_store(cache_key, response_text)
+        else:
+            print(f"⚠️ My API Error ({result.kind}): {result.error}")
+            main.inc("fallbacks", reason=result.kind)
+            use_gemini = False # Trigger fallback block below
+
+    # --- FALLBACK: LOCAL BRAIN ---
+    # Loading and generate are CPU-bound, so keep them off the event loop
+    if not use_gemini:
+        async with main.local_gate:
+            response_text = await asyncio.to_thread(main.generate_locally, user_text, mode, user_data, history)
+
+    main.remember(session_id, user_text, response_text)
+    return {'response': response_text}
+
+
+async def predict_stream(parsed, send, forwarded_for=None, client_addr=None):
+    """
+    Async twin of main.predict_stream. Admission happens before the response
+    starts, so overload still raises Overloaded (a 429); after that the reply
+    is sent as server-sent events.
+    """
+    user_text, mode, user_data, image_data, session_id = parsed
+    if main.rate_limiter is not None:
+        main.rate_limiter.check(main.client_key(user_data, forwarded_for, client_addr))
+    history = main.session_store.history(session_id, main.SESSION_GEMINI_TOKEN_BUDGET)
+
+    cache_key, cached = main.cache_lookup(user_text, mode, user_data, image_data, history)
+    use_gemini = cached is None and main.route(mode, image_data)
+    held = []
+    if cached is None:
+        gate = main.gemini_gate if use_gemini else main.local_gate
+        await gate.aacquire()
+        held.append(gate)
+
+    def release_held():
+        while held:
+            held.pop().release()
+
+    async def chunks():
+        if cached is not None:
+            yield cached
+            return
+
+        if use_gemini:
+            print(f"✨ Streaming '{mode}' from Gemini...")
+            result = await astream_gemini(user_text, mode, user_data, image_data, history)
+            if result.ok:
+                reply = ""
+                async with aclosing(result.chunks) as pieces:
+                    async for chunk in pieces:
+                        reply += chunk
+                        yield chunk
+                main.cache_store(cache_key, reply)
+                return
+            print(f"⚠️ My API Error ({result.kind}): {result.error}")
+            main.inc("fallbacks", reason=result.kind)
+            release_held()
+            try:
+                await main.local_gate.aacquire()
+            except Overloaded:
+                yield main.BUSY_MESSAGE
+                return
+            held.append(main.local_gate)
+
+        # Loading and generate are CPU-bound, so keep them off the event loop
+        bot = await asyncio.to_thread(main.get_local_bot)
+        if bot:
+            local_chunks = bot.stream(user_text, mode, main.local_user_data(user_data, history))
+            async with aclosing(_iterate_in_thread(local_chunks)) as pieces:
+                async for chunk in pieces:
+                    yield chunk
+        else:
+            yield main.offline_message()
+
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        reply = ""
+        async with aclosing(chunks()) as pieces:
+            async for chunk in pieces:
+                if chunk:
+                    reply += chunk
+                    await send({"type": "http.response.body", "body": _event({'chunk': chunk}), "more_body": True})
+        if reply != main.BUSY_MESSAGE:
+            main.remember(session_id, user_text, reply)
+        await send({"type": "http.response.body", "body": _event({'done': True})})
+    finally:
+        release_held()
+
+
+def _event(payload):
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+_DONE = object()
+
+
+async def _iterate_in_thread(iterator):
+    """Async iteration over a blocking generator; each next() runs in a thread."""
+    step = None
+    try:
+        while True:
+            # Shielded: if we're cancelled the thread keeps going, and close()
+            # below has to wait for it
+            step = asyncio.ensure_future(asyncio.to_thread(next, iterator, _DONE))
+            item = await asyncio.shield(step)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        if step is not None and not step.done():
+            await asyncio.wait({step})
+        await asyncio.to_thread(iterator.close)
+
+
+async def _cancel_on_disconnect(receive, coro):
+    """
+    Runs coro until done or until the client goes away. Once a response has
+    started, uvicorn's send() silently drops messages to a closed
+    connection, so this is the only way a stream learns to stop.
+    """
+    task = asyncio.ensure_future(coro)
+    disconnected = False
+
+    async def watch():
+        nonlocal disconnected
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected = True
+        task.cancel()
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await task
+    except asyncio.CancelledError:
+        if not disconnected:
+            raise
+    finally:
+        watcher.cancel()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    data = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+                   + list(headers),
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if aclose_async_client:
+                await aclose_async_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if (
+        scope["type"] == "http"
+        and scope["path"] in ("/predict", "/predict/stream")
+        and scope["method"] == "POST"
+        and acall_gemini is not None
+    ):
+        body = await _read_body(receive)
+        if body is None:
+            return
+        try:
+            parsed = main.parse_request(body)
+        except ValueError:
+            await _send_json(send, 400, {'error': 'Request body must be JSON.'})
+            return
+        headers = dict(scope.get("headers") or ())
+        forwarded_for = headers.get(b"x-forwarded-for", b"").decode("latin-1") or None
+        client_addr = (scope.get("client") or (None,))[0]
+        try:
+            if scope["path"] == "/predict":
+                await _send_json(send, 200, await predict(parsed, forwarded_for, client_addr))
+            else:
+                await _cancel_on_disconnect(receive, predict_stream(parsed, send, forwarded_for, client_addr))
+        except Overloaded as e:
+            await _send_json(send, 429, {'response': main.BUSY_MESSAGE, 'error': e.reason},
+                             [(b"retry-after", str(e.retry_after).encode())])
+        return
+
+    await flask_app(scope, receive, send)
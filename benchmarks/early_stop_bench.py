@@ -0,0 +1,81 @@
+"""
+Tokens the local brain generates versus tokens it actually returns, with and
+without the early-stop criteria (user-turn marker / junk run).
+
+    python benchmarks/early_stop_bench.py --requests 40 --mode relationship
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.predict import DualBot
+
+TEXTS = [
+    "hey what are you up to tonight",
+    "I can't decide what to eat",
+    "tell me a secret",
+    "my code finally compiled",
+    "do you even like me",
+]
+
+
+def _count_generated(output, prompt_length, pad_id):
+    """New tokens per row, not counting the padding added after a row stopped."""
+    counts = []
+    for row in output[:, prompt_length:].tolist():
+        while row and row[-1] == pad_id:
+            row.pop()
+        counts.append(len(row))
+    return counts
+
+
+def run(bot, mode, user, requests):
+    model, tokenizer = bot._load_specific_model(bot.target_mode(mode))
+    generated = []
+    original = model.generate
+
+    def counting_generate(*args, **kwargs):
+        output = original(*args, **kwargs)
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        generated.extend(_count_generated(output, input_ids.shape[1], tokenizer.eos_token_id))
+        return output
+
+    model.generate = counting_generate
+    try:
+        returned, timings = [], []
+        for i in range(requests):
+            start = time.perf_counter()
+            reply = bot.generate(TEXTS[i % len(TEXTS)], mode, user)
+            timings.append((time.perf_counter() - start) * 1000.0)
+            returned.append(len(tokenizer(reply).input_ids))
+    finally:
+        del model.generate
+    return statistics.mean(generated), statistics.mean(returned), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--mode", default="relationship")
+    args = parser.parse_args()
+
+    bot = DualBot()
+    user = {"name": "Bench", "gender": "male"}
+
+    print(f"📊 {args.requests} '{args.mode}' replies\n")
+    print(f"{'early stop':<11} {'generated':>10} {'returned':>9} {'wasted':>7} {'p50 ms':>9}")
+    for early_stop in (False, True):
+        bot.early_stop = early_stop
+        gen, ret, p50 = run(bot, args.mode, user, args.requests)
+        wasted = 1 - ret / gen if gen else 0.0
+        print(f"{'on' if early_stop else 'off':<11} {gen:>10.1f} {ret:>9.1f} {wasted:>7.1%} {p50:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
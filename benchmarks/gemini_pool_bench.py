@@ -0,0 +1,68 @@
+"""
+Compares a fresh connection per Gemini call (plain requests.post) with the
+pooled keep-alive session in gemini_brain, against the local TLS stub.
+
+    python benchmarks/gemini_pool_bench.py --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from gemini_stub import start_stub
+from src import gemini_brain
+
+
+def _run(server, post, n):
+    connections_before = server.connections
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = post()
+        response.raise_for_status()
+        response.json()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings, server.connections - connections_before
+
+
+def _summary(name, timings, connections):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<8} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms"
+          f"   p95 {p95:7.2f} ms   new connections {connections}")
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated upstream think time.")
+    parser.add_argument("--no-tls", action="store_true", help="Plain HTTP (measures TCP setup only).")
+    args = parser.parse_args()
+
+    server, api_base, cert = start_stub(latency_ms=args.latency_ms, tls=not args.no_tls)
+    verify = cert if cert else True
+    url = f"{api_base}/{gemini_brain.MODELS[0]}:generateContent?key=bench"
+    payload = gemini_brain.build_payload("hi", "roast", {"name": "Bench", "gender": "male"})
+
+    session = gemini_brain.get_session()
+
+    print(f"📊 {args.requests} sequential calls against {api_base}\n")
+    fresh = _summary("fresh", *_run(server, lambda: requests.post(url, json=payload, verify=verify, timeout=15), args.requests))
+    pooled = _summary("pooled", *_run(server, lambda: session.post(url, json=payload, verify=verify, timeout=15), args.requests))
+    print(f"\n⚡ Saved {fresh - pooled:.2f} ms per request ({(1 - pooled / fresh) * 100:.1f}%) by reusing connections.")
+
+    gemini_brain.close_session()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
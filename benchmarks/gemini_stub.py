@@ -0,0 +1,151 @@
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent API.
+Used by the benchmarks so they never touch Google or need a real key.
+Latency (with jitter) and error responses can be injected.
+
+    python benchmarks/gemini_stub.py --port 8765 --latency-ms 300 --jitter-ms 100 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "Stub reply from the local Gemini stand-in. 😎"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; don't let Nagle stall them
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # One setup() per accepted TCP connection
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        with self.server.stats_lock:
+            self.server.requests += 1
+
+        delay_ms = self.server.latency_ms
+        if self.server.jitter_ms:
+            delay_ms = max(0.0, delay_ms + random.uniform(-self.server.jitter_ms, self.server.jitter_ms))
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            with self.server.stats_lock:
+                self.server.errors += 1
+            self._send_json(self.server.error_status, {"error": {"code": self.server.error_status, "message": "Injected by the stub"}})
+            return
+
+        if ":streamGenerateContent" in self.path:
+            self._send_stream()
+        else:
+            self._send_json(200, {"candidates": [{"content": {"parts": [{"text": REPLY}]}}]})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in REPLY.split(" "):
+            event = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _self_signed_cert(directory):
+    """Creates a throwaway localhost certificate with the openssl CLI."""
+    if not shutil.which("openssl"):
+        raise RuntimeError("TLS stub needs the openssl command line tool.")
+    cert = os.path.join(directory, "stub.pem")
+    key = os.path.join(directory, "stub.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024   # load tests open hundreds of sockets at once
+
+
+def start_stub(port=0, latency_ms=0, tls=False, jitter_ms=0, error_rate=0.0, error_status=503):
+    """
+    Starts the stub in a background thread. Each call waits latency_ms
+    (+/- jitter_ms) and fails with error_status at error_rate (0-1).
+    Returns (server, api_base, cert_path); cert_path is None without TLS.
+    """
+    server = StubServer(("127.0.0.1", port), StubHandler)
+    server.latency_ms = latency_ms
+    server.jitter_ms = jitter_ms
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.connections = 0
+    server.requests = 0
+    server.errors = 0
+    server.stats_lock = threading.Lock()
+
+    cert_path = None
+    if tls:
+        cert_path, key_path = _self_signed_cert(tempfile.mkdtemp(prefix="gemini-stub-"))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path, key_path)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    threading.Thread(target=server.serve_forever, name="gemini-stub", daemon=True).start()
+    scheme = "https" if tls else "http"
+    api_base = f"{scheme}://127.0.0.1:{server.server_address[1]}/v1beta/models"
+    return server, api_base, cert_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local Gemini stub.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- spread around --latency-ms.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of calls that fail (0-1).")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    server, api_base, cert = start_stub(args.port, args.latency_ms, args.tls,
+                                        args.jitter_ms, args.error_rate, args.error_status)
+    print(f"🧪 Gemini stub listening. Set GEMINI_API_BASE={api_base}")
+    if cert:
+        print(f"   Trust it with REQUESTS_CA_BUNDLE={cert}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
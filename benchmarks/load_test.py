@@ -0,0 +1,444 @@
+"""
+Load test of the whole app: starts it under gunicorn against the local
+Gemini stub (latency / error injection) and a tiny random-weight GPT-2 model
+store for the local path. Then it drives mixed-mode traffic at a fixed
+concurrency, on /predict or (like the dashboard) /predict/stream. Latency
+percentiles, throughput and server RSS are saved as JSON, so runs can be
+compared.
+
+    python benchmarks/load_test.py --requests 500 --concurrency 16 --latency-ms 300 --error-rate 0.05
+    python benchmarks/load_test.py --endpoint stream --concurrency 32
+    python benchmarks/load_test.py --compare benchmarks/results/load-20250101-120000.json
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from gemini_stub import start_stub
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+TEXTS = [
+    "hey what are you up to tonight",
+    "I can't decide what to eat",
+    "tell me a secret",
+    "my code finally compiled",
+    "do you even like me",
+    "roast my haircut",
+    "I got the job!!",
+    "should I text my ex",
+]
+NAMES = ["Sam", "Alex", "Jordan", "Riley"]
+
+# Reported metrics where lower is better (everything but throughput)
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "first_chunk_p50_ms", "first_chunk_p95_ms",
+                   "error_rate", "rss_peak_mb")
+
+
+# --- TINY LOCAL MODEL ---
+
+def _bytes_to_unicode():
+    """GPT-2's byte -> printable character table."""
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + n)
+            n += 1
+    return dict(zip(bs, (chr(c) for c in cs)))
+
+
+def build_tiny_store(store_dir, seed=0, n_positions=1024):
+    """
+    Random-weight 2-layer GPT-2 with a byte-level tokenizer, saved as the
+    active version of a model store (every store entry gets the same model).
+    """
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    from src import model_store
+
+    version = "loadtest"
+    files = os.path.join(store_dir, "tokenizer-files")
+    os.makedirs(files, exist_ok=True)
+    vocab = {char: byte for byte, char in _bytes_to_unicode().items()}
+    vocab["<|endoftext|>"] = 256
+    with open(os.path.join(files, "vocab.json"), "w") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(files, "merges.txt"), "w") as f:
+        f.write("#version: 0.2\n")
+    tokenizer = GPT2Tokenizer(os.path.join(files, "vocab.json"), os.path.join(files, "merges.txt"))
+
+    torch.manual_seed(seed)
+    config = GPT2Config(vocab_size=257, n_positions=n_positions, n_embd=64, n_layer=2, n_head=2,
+                        bos_token_id=256, eos_token_id=256)
+    model = GPT2LMHeadModel(config)
+
+    manifest = {"version": version, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "models": {}}
+    for name in model_store.SOURCES:
+        target = os.path.join(store_dir, version, name)
+        model.save_pretrained(target, safe_serialization=True)
+        tokenizer.save_pretrained(target)
+        manifest["models"][name] = {"source": "random", "seed": seed}
+    with open(os.path.join(store_dir, version, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    model_store.use_version(version, store_dir)
+    return store_dir
+
+
+# --- SERVER ---
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(args, api_base, store_dir, log_file):
+    """Starts gunicorn (like render.yaml) and returns (process, base URL)."""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="loadtest",
+        GEMINI_API_BASE=api_base,
+        LOCAL_BRAIN_ENABLED="1",
+        MODEL_STORE_DIR=store_dir,
+        MODEL_STORE_REQUIRED="1",
+        HF_HUB_OFFLINE="1",
+        WEB_CONCURRENCY=str(args.workers),
+    )
+    command = [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{port}",
+               "--timeout", "120", "--graceful-timeout", "5"]
+    if args.app == "asgi":
+        command += ["-k", "uvicorn.workers.UvicornWorker", "asgi:app"]
+    else:
+        command += ["--threads", str(args.threads), "main:app"]
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(process, base_url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def tree_rss_mb(pid):
+    """RSS of a process and all its descendants (Linux /proc), or None."""
+    total, stack = 0, [pid]
+    try:
+        while stack:
+            current = stack.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+    except (FileNotFoundError, ProcessLookupError):
+        if total == 0:
+            return None
+    return round(total / 1024, 1)
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            rss = tree_rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# --- TRAFFIC ---
+
+def _tiny_image():
+    """Small JPEG data URL, so image requests exercise the upload path."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 80, 120)).save(buffer, format="JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def parse_mix(text):
+    """Parses "relationship=4,roast=3" into [(mode, weight), ...]."""
+    mix = []
+    for item in text.split(","):
+        mode, _, weight = item.partition("=")
+        mix.append((mode.strip(), float(weight or 1)))
+    return mix
+
+
+def plan_requests(args):
+    """The exact request sequence for this seed, so runs are comparable."""
+    rng = random.Random(args.seed)
+    modes, weights = zip(*parse_mix(args.mix))
+    image = _tiny_image() if args.image_rate > 0 else None
+    plan = []
+    for _ in range(args.requests):
+        body = {
+            "text": rng.choice(TEXTS),
+            "mode": rng.choices(modes, weights)[0],
+            "userData": {"name": rng.choice(NAMES), "gender": rng.choice(["male", "female"])},
+        }
+        if image and rng.random() < args.image_rate:
+            body["image"] = image
+        plan.append(body)
+    return plan
+
+
+_local = threading.local()
+
+
+def send(base_url, body, endpoint="predict"):
+    """
+    One request. On /predict/stream, ms is the whole stream and first_chunk_ms
+    the time to the first reply text; a stream without its done event counts
+    as failed.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    start = time.perf_counter()
+    first_chunk_ms = None
+    try:
+        if endpoint == "stream":
+            with session.post(f"{base_url}/predict/stream", json=body, timeout=120, stream=True) as response:
+                status, done = response.status_code, False
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[len("data:"):])
+                    if event.get("chunk") and first_chunk_ms is None:
+                        first_chunk_ms = (time.perf_counter() - start) * 1000.0
+                    done = done or bool(event.get("done"))
+                if status == 200 and not done:
+                    status = "incomplete"
+        else:
+            status = session.post(f"{base_url}/predict", json=body, timeout=120).status_code
+    except requests.RequestException:
+        status = 0
+    return {
+        "mode": body["mode"],
+        "image": "image" in body,
+        "status": status,
+        "ms": (time.perf_counter() - start) * 1000.0,
+        "first_chunk_ms": first_chunk_ms,
+    }
+
+
+def percentile(sorted_values, q):
+    """Nearest rank: the smallest value that q% of the values don't exceed."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return round(sorted_values[rank], 1)
+
+
+def summarize(samples, seconds):
+    timings = sorted(s["ms"] for s in samples)
+    errors = sum(1 for s in samples if s["status"] != 200)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / seconds, 2) if seconds else None,
+        "mean_ms": round(sum(timings) / len(timings), 1) if timings else None,
+        "p50_ms": percentile(timings, 50),
+        "p95_ms": percentile(timings, 95),
+        "p99_ms": percentile(timings, 99),
+        "max_ms": round(timings[-1], 1) if timings else None,
+        **first_chunk_stats(samples),
+    }
+
+
+def first_chunk_stats(samples):
+    """Time-to-first-chunk percentiles (stream runs only)."""
+    timings = sorted(s["first_chunk_ms"] for s in samples if s.get("first_chunk_ms") is not None)
+    if not timings:
+        return {}
+    return {
+        "first_chunk_p50_ms": percentile(timings, 50),
+        "first_chunk_p95_ms": percentile(timings, 95),
+        "first_chunk_p99_ms": percentile(timings, 99),
+    }
+
+
+def compare(current, baseline_path, tolerance, current_endpoint="predict"):
+    """Prints metric deltas against an earlier run; True if anything regressed."""
+    with open(baseline_path) as f:
+        report = json.load(f)
+    baseline = report["results"]
+
+    regressed = False
+    print(f"\n🔍 Compared with {baseline_path} (tolerance {tolerance:.0%})")
+    baseline_endpoint = report.get("config", {}).get("endpoint", "predict")
+    if baseline_endpoint != current_endpoint:
+        print(f"   ⚠️ Baseline drove /{baseline_endpoint}, this run /{current_endpoint}: durations differ in kind")
+    for key in LOWER_IS_BETTER + ("throughput_rps",):
+        old, new = baseline.get(key), current.get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+        if key == "error_rate":
+            # Relative change means little near zero errors
+            worse = new - old > tolerance * max(old, 0.01)
+        regressed |= worse
+        print(f"   {key:<15} {old:>10} -> {new:<10} ({change:+.1%}){'  ❌' if worse else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=8, help="Unmeasured requests first (loads models).")
+    parser.add_argument("--mix", default="relationship=4,roast=3,friend=2,smart=1", help="mode=weight list.")
+    parser.add_argument("--image-rate", type=float, default=0.1, help="Fraction of requests with a photo.")
+    parser.add_argument("--endpoint", choices=["predict", "stream"], default="predict",
+                        help="predict = /predict, stream = /predict/stream (what the dashboard uses).")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub Gemini latency.")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Stub Gemini failure rate (0-1).")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--app", choices=["asgi", "wsgi"], default="asgi",
+                        help="asgi = UvicornWorker + asgi:app (production), wsgi = sync main:app.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="Threads per sync worker (wsgi only).")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/load-<time>.json).")
+    parser.add_argument("--compare", help="Earlier result file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown.")
+    args = parser.parse_args()
+
+    stub, api_base, _ = start_stub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                   error_rate=args.error_rate, error_status=args.error_status)
+    workdir = tempfile.mkdtemp(prefix="vibe-loadtest-")
+    print(f"🧪 Building tiny random GPT-2 store in {workdir}...")
+    store_dir = build_tiny_store(os.path.join(workdir, "model_store"), seed=args.seed)
+
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log_file:
+        process, base_url = start_app(args, api_base, store_dir, log_file)
+        try:
+            wait_ready(process, base_url)
+            plan = plan_requests(args)
+            print(f"🔥 Warming up with {args.warmup} request(s)...")
+            for body in plan[:args.warmup]:
+                send(base_url, body, args.endpoint)
+
+            stub_before = (stub.requests, stub.errors)
+            rss_idle = tree_rss_mb(process.pid)
+            sampler = RssSampler(process.pid)
+            sampler.start()
+
+            print(f"📊 {args.requests} /{args.endpoint} requests, concurrency {args.concurrency}, "
+                  f"{args.app} x {args.workers} worker(s)")
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                samples = list(pool.map(lambda body: send(base_url, body, args.endpoint), plan))
+            seconds = time.perf_counter() - started
+            sampler.stop()
+
+            health = requests.get(f"{base_url}/health", timeout=5).json()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    results = summarize(samples, seconds)
+    results.update(
+        duration_s=round(seconds, 2),
+        rss_idle_mb=rss_idle,
+        rss_peak_mb=sampler.peak,
+        status_codes=dict(Counter(str(s["status"]) for s in samples)),
+        stub={"requests": stub.requests - stub_before[0], "injected_errors": stub.errors - stub_before[1]},
+    )
+    groups = defaultdict(list)
+    for s in samples:
+        groups[s["mode"] + (" +image" if s["image"] else "")].append(s)
+    results["by_mode"] = {name: summarize(group, seconds) for name, group in sorted(groups.items())}
+    stub.shutdown()
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+        "health": health,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    streamed = args.endpoint == "stream"
+    print(f"\n{'group':<22} {'n':>5} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          + (f" {'first p50':>10} {'first p95':>10}" if streamed else ""))
+    for name, r in [("all", results)] + list(results["by_mode"].items()):
+        print(f"{name:<22} {r['requests']:>5} {r['errors']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}"
+              + (f" {str(r.get('first_chunk_p50_ms')):>10} {str(r.get('first_chunk_p95_ms')):>10}" if streamed else ""))
+    print(f"\n⚡ {results['throughput_rps']} req/s over {results['duration_s']}s, "
+          f"RSS {rss_idle} MB idle / {sampler.peak} MB peak, "
+          f"stub errors injected: {results['stub']['injected_errors']}")
+    print(f"📝 Results written to {output} (server log: {log_path})")
+
+    if args.compare and compare(results, args.compare, args.tolerance, args.endpoint):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Time-to-first-token of the local brain with and without the prefix KV cache
+(static per-mode prompt heads pre-filled once per model).
+
+    python benchmarks/prefix_cache_bench.py --iterations 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.personas import local_prompt_prefix
+from src.prefix_cache import PrefixCache
+from src.predict import DualBot
+
+TEXTS = [
+    "hey what are you up to tonight",
+    "I can't decide what to eat",
+    "tell me a secret",
+    "my code finally compiled",
+]
+
+
+def time_to_first_token(bot, model, tokenizer, mode, user, text):
+    """One new token: prompt tokenization + prefill + the first decode step."""
+    import torch
+
+    start = time.perf_counter()
+    prompt = bot._build_prompt(text, mode, user)
+    input_ids, attention_mask, extra = bot._encode(model, tokenizer, [prompt], [(text, mode, user)])
+    with torch.no_grad():
+        model.generate(input_ids, attention_mask=attention_mask, max_new_tokens=1, do_sample=False,
+                       pad_token_id=tokenizer.eos_token_id, **extra)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", default=["relationship", "friend", "therapy"])
+    args = parser.parse_args()
+
+    bot = DualBot()
+    user = {"name": "Bench", "gender": "male"}
+    print(f"📊 TTFT over {args.iterations} prompts per mode\n")
+    print(f"{'mode':<13} {'prefix tok':>10} {'prompt tok':>10} {'off p50 ms':>11} {'on p50 ms':>10} {'saved':>7}")
+
+    for mode in args.modes:
+        model, tokenizer = bot._load_specific_model(bot.target_mode(mode))
+        prefix = local_prompt_prefix(mode, user["gender"]).rstrip(" \t")
+        prompt_tokens = len(tokenizer(bot._build_prompt(TEXTS[0], mode, user)).input_ids)
+
+        results = {}
+        for label, cache in (("off", None), ("on", PrefixCache())):
+            bot.prefix_cache = cache
+            time_to_first_token(bot, model, tokenizer, mode, user, TEXTS[0])   # warm up / fill cache
+            results[label] = statistics.median(
+                time_to_first_token(bot, model, tokenizer, mode, user, TEXTS[i % len(TEXTS)])
+                for i in range(args.iterations)
+            )
+
+        saved = 1 - results["on"] / results["off"]
+        print(f"{mode:<13} {len(tokenizer(prefix).input_ids):>10} {prompt_tokens:>10}"
+              f" {results['off']:>11.2f} {results['on']:>10.2f} {saved:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
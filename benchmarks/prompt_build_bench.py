@@ -0,0 +1,104 @@
+"""
+Per-request prompt build cost: the old inline f-string persona code versus
+src/personas.py (precompiled Gemini templates, f-string local prompts).
+
+    python benchmarks/prompt_build_bench.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.personas import local_prompt, system_instruction
+
+CASES = [(mode, gender) for mode in ("relationship", "roast", "friend", "therapy", "smart") for gender in ("male", "female")]
+HISTORY = [("user", "hey"), ("bot", "hi there"), ("user", "what's up"), ("bot", "not much"), ("user", "cool")]
+
+
+def inline_system_instruction(mode, gender, name):
+    """The per-request persona code gemini_brain used before personas.py."""
+    if gender == 'male':
+        role = "Girlfriend"
+        tone = "playful, sweet, slightly clingy, and very flirty"
+        engagement_strategy = (
+            "Tease him playfully. If he gives short answers, roast him gently. "
+            "Always ask a follow-up question to keep him talking. Act like you are obsessed with him. "
+            "Don't let him leave. Keep him company."
+        )
+    else:
+        role = "Boyfriend"
+        tone = "charming, protective, confident, and humorous"
+        engagement_strategy = (
+            "Make her laugh. Be confident but sweet. Tease her about her day. "
+            "Don't let the conversation get boring. Use nicknames like 'love', 'trouble', or 'beautiful'. "
+            "Keep the vibe alive."
+        )
+
+    base_prompt = f"User is {name}. You are {name}'s {role}. "
+
+    if mode == "relationship":
+        return (
+            f"{base_prompt} Your tone is {tone}. {engagement_strategy} "
+            f"Your goal is to keep {name} busy and entertained. Never give dry, one-word answers. "
+            f"Share random funny thoughts, ask about their life, or propose cute hypothetical scenarios. "
+            f"If they send an image, react with excitement and love."
+        )
+    elif mode == "roast":
+        return f"You are a savage comedian. Roast {name} about their text or image. Be brutal but funny. Use emojis 💀."
+    elif mode == "friend":
+        return f"You are {name}'s chaotic best friend. Use slang (Gen-Z style). Spill tea, crack jokes, and just vibe. Don't be formal."
+    elif mode == "therapy":
+        return f"You are a warm, empathetic therapist. Listen to {name}, validate their feelings, and offer gentle advice. Don't be clinical, be human."
+    else:
+        return f"You are a super-intelligent assistant who has a crush on {name}. Be helpful and smart, but add a little flirty flair to your answers."
+
+
+def inline_local_prompt(mode, gender, name, text):
+    """The per-request prompt code DualBot.generate used before personas.py."""
+    gender = gender.lower()
+    if mode == "relationship":
+        role = "Girlfriend" if gender == 'male' else "Boyfriend"
+        tone = "flirty and sweet"
+        return f"Instruction: Act as {name}'s {tone} {role}.\n{name}: {text}\n{role}:"
+    elif mode == "roast":
+        return f"Input: {text}\nRoast:"
+    else:
+        return f"Context: Best friends chatting.\n{name}: {text}\nBestie:"
+
+
+def _per_call_ns(fn, iterations):
+    def run():
+        for mode, gender in CASES:
+            fn(mode, gender)
+    seconds = min(timeit.repeat(run, number=max(1, iterations // len(CASES)), repeat=5))
+    return seconds / (max(1, iterations // len(CASES)) * len(CASES)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    # Same output before timing anything
+    for mode, gender in CASES:
+        assert inline_system_instruction(mode, gender, "Sam") == system_instruction(mode, gender, "Sam")
+        assert inline_local_prompt(mode, gender, "Sam", "hi") == local_prompt(mode, gender, "Sam", "hi")
+
+    rows = [
+        ("gemini inline", _per_call_ns(lambda m, g: inline_system_instruction(m, g, "Sam"), args.iterations)),
+        ("gemini template", _per_call_ns(lambda m, g: system_instruction(m, g, "Sam"), args.iterations)),
+        ("local inline", _per_call_ns(lambda m, g: inline_local_prompt(m, g, "Sam", "hi"), args.iterations)),
+        ("local personas", _per_call_ns(lambda m, g: local_prompt(m, g, "Sam", "hi"), args.iterations)),
+        ("local + history", _per_call_ns(lambda m, g: local_prompt(m, g, "Sam", "hi", HISTORY), args.iterations)),
+    ]
+    print(f"📊 Prompt build cost per request ({args.iterations} builds each)\n")
+    for name, ns in rows:
+        print(f"{name:<16} {ns:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+fp32 versus dynamic int8 for one local mode: generation speed, peak RSS and
+perplexity on held-out dataset lines (the ones past the training limit).
+Each variant runs in its own process so peak RSS isn't shared.
+
+    python -m src.model_store quantize          # optional: use the int8 export
+    python benchmarks/quantization_bench.py --mode roast --prompts 8 --lines 200
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PROMPTS = [
+    "my boss keeps scheduling meetings at 5pm",
+    "I just bought a third air fryer",
+    "do you think I can pull off a mullet",
+    "I failed my driving test again",
+    "what should we do this weekend",
+    "I cooked dinner and set off the smoke alarm",
+    "tell me something nice",
+    "I think my cat hates me",
+]
+
+# Used when there is no dataset in data/ to hold lines out from
+FALLBACK_LINES = [
+    "I told my wife she was drawing her eyebrows too high. She looked surprised.",
+    "Are you a parking ticket? Because you've got fine written all over you.",
+    "I used to play piano by ear, but now I use my hands.",
+    "Do you have a map? I keep getting lost in your eyes.",
+    "Why don't skeletons fight each other? They don't have the guts.",
+    "I'm reading a book about anti-gravity. It's impossible to put down.",
+]
+
+
+def held_out_lines(mode, count, train_limit=5000):
+    try:
+        from src.preprocess import load_and_clean_data
+        data, _ = load_and_clean_data(mode, limit=None)
+    except Exception as e:
+        print(f"⚠️ Could not read the {mode} dataset: {e}")
+        data = []
+    if not data:
+        print("⚠️ No dataset found, using built-in sample lines for perplexity.")
+        return FALLBACK_LINES[:count]
+    # Lines past the training cut were never seen by the model
+    unseen = data[train_limit:] or data
+    return unseen[-count:]
+
+
+def perplexity(model, tokenizer, lines):
+    import torch
+
+    total_nll, total_tokens = 0.0, 0
+    with torch.no_grad():
+        for line in lines:
+            ids = tokenizer(line, return_tensors="pt", truncation=True, max_length=128).input_ids
+            if ids.shape[1] < 2:
+                continue
+            loss = model(ids, labels=ids).loss.item()
+            total_nll += loss * (ids.shape[1] - 1)
+            total_tokens += ids.shape[1] - 1
+    return math.exp(total_nll / total_tokens) if total_tokens else float("nan")
+
+
+def run_variant(args):
+    """Child process: load one variant through DualBot and measure it."""
+    if args.variant == "int8":
+        os.environ["LOCAL_QUANTIZED_MODES"] = args.mode
+    import torch
+    from src.predict import DualBot, _model_nbytes
+
+    bot = DualBot()
+    target = bot.target_mode(args.mode)
+    start = time.perf_counter()
+    model, tokenizer = bot._load_specific_model(target)
+    load_s = time.perf_counter() - start
+
+    prompts = [bot._build_prompt(text, args.mode, {"name": "Bench", "gender": "male"})
+               for text in (PROMPTS * args.prompts)[:args.prompts]]
+    generated, start = 0, time.perf_counter()
+    with torch.no_grad():
+        for prompt in prompts:
+            ids = tokenizer(prompt, return_tensors="pt").input_ids
+            output = model.generate(ids, max_new_tokens=args.new_tokens, min_new_tokens=args.new_tokens,
+                                    do_sample=False, pad_token_id=tokenizer.eos_token_id)
+            generated += output.shape[1] - ids.shape[1]
+    gen_s = time.perf_counter() - start
+
+    result = {
+        "variant": args.variant,
+        "load_s": round(load_s, 3),
+        "tokens_per_s": round(generated / gen_s, 1),
+        "weights_mb": round(_model_nbytes(model) / 2 ** 20, 1),
+        "perplexity": round(perplexity(model, tokenizer, held_out_lines(args.mode, args.lines)), 3),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    print("RESULT " + json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", default="roast")
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--new-tokens", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=200, help="Held-out lines for perplexity.")
+    parser.add_argument("--variant", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args)
+        return
+
+    results = {}
+    for variant in ("fp32", "int8"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--variant", variant, "--mode", args.mode,
+             "--prompts", str(args.prompts), "--new-tokens", str(args.new_tokens), "--lines", str(args.lines)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+        results[variant] = json.loads(line[len("RESULT "):])
+
+    print(f"📊 {args.mode}: {args.prompts} prompts x {args.new_tokens} new tokens, {args.lines} held-out lines\n")
+    print(f"{'variant':<8} {'load s':>8} {'tokens/s':>9} {'weights MB':>11} {'peak RSS MB':>12} {'perplexity':>11}")
+    for r in results.values():
+        print(f"{r['variant']:<8} {r['load_s']:>8} {r['tokens_per_s']:>9} {r['weights_mb']:>11}"
+              f" {r['peak_rss_mb']:>12} {r['perplexity']:>11}")
+
+    fp32, int8 = results["fp32"], results["int8"]
+    print(f"\nspeedup x{int8['tokens_per_s'] / fp32['tokens_per_s']:.2f}   "
+          f"peak RSS {int8['peak_rss_mb'] - fp32['peak_rss_mb']:+.1f} MB   "
+          f"perplexity delta {int8['perplexity'] - fp32['perplexity']:+.3f}")
+
+
+if __name__ == "__main__":
+    main()
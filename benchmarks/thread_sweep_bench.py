@@ -0,0 +1,111 @@
+"""
+Sweeps torch thread settings for the local brain: single-request latency and
+throughput under concurrent load (through the batch scheduler, as served).
+Each configuration runs in its own process, since thread pools are per process.
+
+    python benchmarks/thread_sweep_bench.py --configs 1x1 2x1 4x1 auto --concurrency 8
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+# Path setup (run from anywhere)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PROMPTS = [
+    "my boss keeps scheduling meetings at 5pm",
+    "I just bought a third air fryer",
+    "do you think I can pull off a mullet",
+    "I failed my driving test again",
+]
+
+
+def run_config(args):
+    """Child process: measure one thread configuration."""
+    from src.batching import BatchScheduler
+    from src.predict import DualBot
+
+    bot = DualBot()
+    user = {"name": "Bench", "gender": "male"}
+    bot.generate("warm up", args.mode, user)
+
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        bot.generate(PROMPTS[i % len(PROMPTS)], args.mode, user)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    batcher = BatchScheduler(bot)
+    total = args.requests * args.concurrency
+
+    def client(offset):
+        for i in range(args.requests):
+            batcher.generate(PROMPTS[(offset + i) % len(PROMPTS)], args.mode, user)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(args.concurrency)]
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print("RESULT " + json.dumps({
+        "threads": bot.threads,
+        "p50_ms": round(statistics.median(latencies), 1),
+        # Nearest rank: the smallest latency that 95% of requests don't exceed
+        "p95_ms": round(latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)], 1),
+        "throughput_rps": round(total / elapsed, 2),
+    }))
+
+
+def _env_for(config):
+    """'4x2' -> 4 intra-op, 2 inter-op threads; 'auto' -> worker-aware split."""
+    env = dict(os.environ)
+    if config == "auto":
+        env["TORCH_THREADS"] = "auto"
+    else:
+        intra, _, inter = config.partition("x")
+        env["TORCH_THREADS"] = intra
+        env["TORCH_INTEROP_THREADS"] = inter or "1"
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--configs", nargs="+", default=["1x1", "2x1", "4x1", "auto"],
+                        help="INTRAxINTER thread pairs, or 'auto'.")
+    parser.add_argument("--mode", default="roast")
+    parser.add_argument("--requests", type=int, default=8, help="Sequential requests (and per client under load).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_config(args)
+        return
+
+    print(f"📊 {args.mode}: {args.requests} sequential requests, then {args.concurrency} clients x {args.requests}\n")
+    print(f"{'config':<8} {'intra':>5} {'inter':>5} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>7}")
+    for config in args.configs:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--mode", args.mode,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            env=_env_for(config), capture_output=True, text=True, check=True,
+        ).stdout
+        line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+        r = json.loads(line[len("RESULT "):])
+        print(f"{config:<8} {r['threads']['intra_op']:>5} {r['threads']['inter_op']:>5}"
+              f" {r['p50_ms']:>9} {r['p95_ms']:>9} {r['throughput_rps']:>7}")
+
+
+if __name__ == "__main__":
+    main()
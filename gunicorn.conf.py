@@ -0,0 +1,15 @@
+# Gunicorn reads this file automatically when started from the project root
+# (`gunicorn -k uvicorn.workers.UvicornWorker asgi:app` in render.yaml).
+import os
+import sys
+
+# LOCAL_BRAIN_PRELOAD_MODE=fork loads the local models once in the master
+# before forking, so every worker shares the same weights copy-on-write.
+preload_app = os.getenv("LOCAL_BRAIN_PRELOAD_MODE", "thread") == "fork"
+
+
+def worker_exit(server, worker):
+    # Close this worker's pooled keep-alive connections to Gemini
+    gemini_brain = sys.modules.get("src.gemini_brain")
+    if gemini_brain is not None:
+        gemini_brain.close_session()
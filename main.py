@@ -1,6 +1,11 @@
 import sys
 import os
-from flask import Flask, render_template, request, jsonify
+import json
+import threading
+import time
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+
+_import_started = time.perf_counter()
 
 # Path setup
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -9,43 +14,369 @@ sys.path.append(src_dir)
 
 app = Flask(__name__)
 
+# The local GPT-2 brain is opt-in: it needs far more RAM than the free tier has.
+# For batching to help, serve with threads, e.g. `gunicorn --threads 8 main:app`.
+LOCAL_BRAIN_ENABLED = os.getenv("LOCAL_BRAIN_ENABLED", "0") == "1"
+
+# Modes to load at startup instead of on the first fallback request,
+# e.g. "roast,relationship,friend". Empty keeps the old lazy behavior.
+LOCAL_BRAIN_PRELOAD = [m.strip() for m in os.getenv("LOCAL_BRAIN_PRELOAD", "").split(",") if m.strip()]
+# "thread": each worker loads in the background and /ready says 503 until done.
+# "fork": load once in the gunicorn master (preload_app, see gunicorn.conf.py)
+#         so workers share the weights copy-on-write.
+LOCAL_BRAIN_PRELOAD_MODE = os.getenv("LOCAL_BRAIN_PRELOAD_MODE", "thread")
+
+# With a socket path, jobs go to a separate inference server process
+# (python -m src.inference_server) instead of a model copy per worker.
+from src.inference_server import LOCAL_INFERENCE_SOCKET, InferenceClient
+
+# --- LAZY LOADERS ---
+local_bot = None
+local_batcher = None
+_batcher_pid = None
+_local_lock = threading.Lock()
+
+startup_timings = {}    # stage -> seconds
+startup_ready = threading.Event()
+
+def get_local_bot():
+    """Returns the batching front for the local brain, or None if unavailable."""
+    global local_bot, local_batcher, _batcher_pid
+    if not LOCAL_BRAIN_ENABLED:
+        return None
+    with _local_lock:
+        if LOCAL_INFERENCE_SOCKET:
+            if local_batcher is None:
+                local_batcher = InferenceClient(LOCAL_INFERENCE_SOCKET)
+            return local_batcher
+        if local_bot is None:
+            try:
+                print("⏳ Loading Local Brain (Backup)...")
+                started = time.perf_counter()
+                from src.predict import DualBot
+                local_bot = DualBot()
+                startup_timings['import_libraries'] = round(time.perf_counter() - started, 3)
+            except Exception as e:
+                print(f"⚠️ Local brain unavailable: {e}")
+                return None
+        if local_batcher is None or _batcher_pid != os.getpid():
+            # Threads don't survive a fork, so a preloaded bot gets a fresh
+            # scheduler in every worker
+            from src.batching import BatchScheduler
+            local_batcher = BatchScheduler(local_bot)
+            _batcher_pid = os.getpid()
+    return local_batcher
+
+def preload_local_brain():
+    """Imports torch/transformers and loads every LOCAL_BRAIN_PRELOAD mode."""
+    started = time.perf_counter()
+    try:
+        if get_local_bot() is None:
+            return
+        for mode in LOCAL_BRAIN_PRELOAD:
+            target = local_bot.target_mode(mode)
+            if f'load_{target}' in startup_timings:
+                continue
+            mode_started = time.perf_counter()
+            local_bot._load_specific_model(target)
+            startup_timings[f'load_{target}'] = round(time.perf_counter() - mode_started, 3)
+        startup_timings['preload_total'] = round(time.perf_counter() - started, 3)
+        print(f"✅ Local brain preloaded in {startup_timings['preload_total']}s: {startup_timings}")
+    except Exception as e:
+        print(f"⚠️ Local brain preload failed: {e}")
+    finally:
+        startup_ready.set()
+
+# Optional reply cache for repeated prompts (RESPONSE_CACHE_ENABLED=1)
+from src.response_cache import RESPONSE_CACHE_ENABLED, ResponseCache, make_key
+from src.image_prep import image_stats
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+
+# Per-stage latency histograms and counters for /metrics
+from src.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, inc, render as render_metrics, stats_gauges, timed
+
+# Concurrency limits per path and an optional per-user rate limit (429 when over)
+from src.admission import BUSY_MESSAGE, Overloaded, client_key, gemini_gate, local_gate, rate_limiter
+
+# Identical local requests in flight at the same time share one generate
+from src.single_flight import SingleFlight
+local_flight = SingleFlight("local")
+
+# Recent turns per chat (the dashboard sends a sessionId)
+from src.sessions import SESSION_GEMINI_TOKEN_BUDGET, SESSION_LOCAL_TOKEN_BUDGET, SessionStore, within_budget
+session_store = SessionStore()
+
+def cache_lookup(user_text, mode, user_data, image_data, history=None):
+    """
+    Returns (key, cached reply or None). The key is None with the cache off,
+    or mid-conversation, where the same text can deserve a different reply.
+    """
+    if response_cache is None or history:
+        return None, None
+    key = make_key(user_text, mode, user_data, image_data)
+    return key, response_cache.get(key)
+
+def cache_store(key, reply):
+    if key is not None and reply:
+        response_cache.put(key, reply)
+
 # Try importing Gemini
 try:
-    from src.gemini_brain import generate_gemini_response
+    from src.gemini_brain import GEMINI_FLIGHT, call_gemini, stream_gemini, any_model_available, breaker_states
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
     print("⚠️ Gemini module not found.")
 
+def use_gemini_for(mode, image_data):
+    """
+    By default we rely 100% on Gemini because it is smarter and doesn't crash
+    the free server. With the local brain enabled, 'roast' goes local and
+    Gemini failures fall back to it. While every Gemini circuit is open we
+    don't even try.
+    """
+    return GEMINI_AVAILABLE and any_model_available() and (
+        not LOCAL_BRAIN_ENABLED or
+        mode in ('relationship', 'smart', 'friend') or
+        bool(image_data)
+    )
+
+def offline_message():
+    if GEMINI_AVAILABLE:
+        # Give a helpful error message instead of crashing
+        return "I'm having trouble connecting to my brain. (Check Render API Key)"
+    return "System Error: My Brain missing."
+
+def local_user_data(user_data, history):
+    """user_data for the local brain, carrying the turns that fit its smaller budget."""
+    if not history:
+        return user_data
+    return dict(user_data, history=within_budget(history, SESSION_LOCAL_TOKEN_BUDGET))
+
+def generate_locally(user_text, mode, user_data, history=None):
+    """Local brain reply, or the offline message if it isn't available."""
+    bot = get_local_bot()
+    if bot:
+        # Local brain can't see images, so we ignore image_data here
+        key = None if history else make_key(user_text, mode, user_data)
+        return local_flight.do(key, bot.generate, user_text, mode, local_user_data(user_data, history))
+    return offline_message()
+
+def remember(session_id, user_text, reply):
+    """Adds the exchange to the session (offline notices aren't conversation)."""
+    if reply != offline_message():
+        session_store.append(session_id, user_text, reply)
+
 @app.route('/')
 def home():
     return render_template('dashboard.html')
 
+def parse_request(body):
+    """
+    (text, mode, user_data, image_data, session_id) of a /predict body: the
+    Flask request, or the raw bytes in asgi.py. JSON decoding is timed too.
+    """
+    with timed("request_parse"):
+        data = json.loads(body) if isinstance(body, (bytes, str)) else body.json
+        return (
+            data.get('text', ''),
+            data.get('mode', 'relationship'),
+            data.get('userData', {}),
+            data.get('image', None),
+            data.get('sessionId'),
+        )
+
+def route(mode, image_data):
+    with timed("route"):
+        return use_gemini_for(mode, image_data)
+
+def check_rate_limit(user_data):
+    if rate_limiter is not None:
+        rate_limiter.check(client_key(user_data, request.headers.get('X-Forwarded-For'), request.remote_addr))
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Fast rejection instead of queueing behind slow requests."""
+    return jsonify({'response': BUSY_MESSAGE, 'error': e.reason}), 429, {'Retry-After': str(e.retry_after)}
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    data = request.json
-    user_text = data.get('text', '')
-    mode = data.get('mode', 'relationship')
-    user_data = data.get('userData', {})
-    image_data = data.get('image', None)
+    user_text, mode, user_data, image_data, session_id = parse_request(request)
+    check_rate_limit(user_data)
 
     response_text = ""
+    history = session_store.history(session_id, SESSION_GEMINI_TOKEN_BUDGET)
 
-    # --- CLOUD-ONLY LOGIC ---
-    # We rely 100% on Gemini because it is smarter and doesn't crash the free server.
-    if GEMINI_AVAILABLE:
+    cache_key, cached = cache_lookup(user_text, mode, user_data, image_data, history)
+    if cached is not None:
+        remember(session_id, user_text, cached)
+        return jsonify({'response': cached})
+
+    # --- ROUTING ---
+    use_gemini = route(mode, image_data)
+
+    if use_gemini:
         print(f"✨ Routing '{mode}' to Gemini...")
-        response_text = generate_gemini_response(user_text, mode, user_data, image_data)
+        with gemini_gate:
+            result = call_gemini(user_text, mode, user_data, image_data, history)
         
-        # If Gemini fails, give a helpful error message instead of crashing
-        if "Error" in response_text or "failed" in response_text:
-            print(f"⚠️ My API Error: {response_text}")
-            response_text = "I'm having trouble connecting to my brain. (Check Render API Key)"
-    else:
-        response_text = "System Error: My Brain missing."
+        if result.ok:
+            response_text = result.text
+            cache_store(cache_key, response_text)
+        else:
+            print(f"⚠️ My API Error ({result.kind}): {result.error}")
+            inc("fallbacks", reason=result.kind)
+            use_gemini = False # Trigger fallback block below
 
+    # --- FALLBACK: LOCAL BRAIN ---
+    if not use_gemini:
+        with local_gate:
+            response_text = generate_locally(user_text, mode, user_data, history)
+
+    remember(session_id, user_text, response_text)
     return jsonify({'response': response_text})
 
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """Same routing as /predict, but sends the reply as server-sent events."""
+    user_text, mode, user_data, image_data, session_id = parse_request(request)
+    check_rate_limit(user_data)
+    history = session_store.history(session_id, SESSION_GEMINI_TOKEN_BUDGET)
+
+    # Admission happens before the stream starts, so overload is still a 429
+    cache_key, cached = cache_lookup(user_text, mode, user_data, image_data, history)
+    use_gemini = cached is None and route(mode, image_data)
+    held = []
+    if cached is None:
+        gate = gemini_gate if use_gemini else local_gate
+        gate.acquire()
+        held.append(gate)
+
+    def release_held():
+        while held:
+            held.pop().release()
+
+    def chunks():
+        if cached is not None:
+            yield cached
+            return
+
+        if use_gemini:
+            print(f"✨ Streaming '{mode}' from Gemini...")
+            result = stream_gemini(user_text, mode, user_data, image_data, history)
+            if result.ok:
+                reply = ""
+                for chunk in result.chunks:
+                    reply += chunk
+                    yield chunk
+                cache_store(cache_key, reply)
+                return
+            print(f"⚠️ My API Error ({result.kind}): {result.error}")
+            inc("fallbacks", reason=result.kind)
+            release_held()
+            try:
+                local_gate.acquire()
+            except Overloaded:
+                yield BUSY_MESSAGE
+                return
+            held.append(local_gate)
+
+        bot = get_local_bot()
+        if bot:
+            yield from bot.stream(user_text, mode, local_user_data(user_data, history))
+        else:
+            yield offline_message()
+
+    def events():
+        # Released here: not every server calls close() on the response (asgiref's WsgiToAsgi doesn't)
+        try:
+            reply = ""
+            for chunk in chunks():
+                if chunk:
+                    reply += chunk
+                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+            if reply != BUSY_MESSAGE:
+                remember(session_id, user_text, reply)
+            yield f"data: {json.dumps({'done': True})}\n\n"
+        finally:
+            release_held()
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # For streams closed by a WSGI server before they ever started
+    response.call_on_close(release_held)
+    return response
+
+@app.route('/health')
+def health():
+    """Circuit breaker state per Gemini model and local brain status."""
+    gemini = breaker_states() if GEMINI_AVAILABLE else {}
+    gemini_up = GEMINI_AVAILABLE and any_model_available()
+    server = None
+    if LOCAL_BRAIN_ENABLED and LOCAL_INFERENCE_SOCKET:
+        server = get_local_bot().stats()
+    local_up = local_bot is not None or (server is not None and 'error' not in server)
+    return jsonify({
+        'status': 'ok' if gemini_up or local_up else 'degraded',
+        'gemini': {'available': gemini_up, 'models': gemini},
+        'local_brain': {'enabled': LOCAL_BRAIN_ENABLED, 'loaded': local_up,
+                        'ready': startup_ready.is_set(),
+                        'threads': local_bot.threads if local_bot is not None else None,
+                        'server': server},
+        'response_cache': response_cache.stats() if response_cache is not None else None,
+        'sessions': session_store.stats(),
+        'single_flight': {'gemini': GEMINI_FLIGHT.stats() if GEMINI_AVAILABLE else None,
+                          'local': local_flight.stats()},
+        'admission': {'gemini': gemini_gate.stats(), 'local': local_gate.stats(),
+                      'rate_limit': rate_limiter.stats() if rate_limiter is not None else None},
+        'images': image_stats(),
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape target: stage histograms, counters and cache/breaker stats."""
+    gauges = []
+    if response_cache is not None:
+        gauges += stats_gauges("response_cache", response_cache.stats())
+    gauges += stats_gauges("sessions", session_store.stats())
+    for gate in (gemini_gate, local_gate):
+        gauges += stats_gauges("admission", gate.stats(), gate=gate.name)
+    for flight in ([GEMINI_FLIGHT] if GEMINI_AVAILABLE else []) + [local_flight]:
+        gauges += stats_gauges("single_flight", flight.stats(), flight=flight.name)
+    if GEMINI_AVAILABLE:
+        for model_name, breaker in breaker_states().items():
+            gauges += stats_gauges("gemini_breaker", breaker, model=model_name)
+    if local_bot is not None:
+        stats = local_bot.cache_stats()
+        gauges += stats_gauges("model_cache", stats)
+        gauges += stats_gauges("prefix_cache", stats.get("prefix_cache"))
+    if local_batcher is not None:
+        gauges += stats_gauges("local_batching", local_batcher.stats())
+    return Response(render_metrics(gauges), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 503 until the configured local modes are loaded."""
+    return jsonify({
+        'ready': startup_ready.is_set(),
+        'preload': LOCAL_BRAIN_PRELOAD if LOCAL_BRAIN_ENABLED else [],
+        'timings': startup_timings,
+    }), 200 if startup_ready.is_set() else 503
+
+startup_timings['import_app'] = round(time.perf_counter() - _import_started, 3)
+
+# --- WARM START ---
+if LOCAL_BRAIN_ENABLED and LOCAL_BRAIN_PRELOAD and not LOCAL_INFERENCE_SOCKET:
+    if LOCAL_BRAIN_PRELOAD_MODE == "fork":
+        preload_local_brain()
+    else:
+        threading.Thread(target=preload_local_brain, name="local-brain-preload", daemon=True).start()
+else:
+    startup_ready.set()
+
 if __name__ == '__main__':
     # Local testing can still use debug mode
     app.run(debug=True, port=5000)
\ No newline at end of file
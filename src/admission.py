@@ -0,0 +1,230 @@
+"""
+Admission control for /predict: separate concurrency limits for the Gemini
+and local-model paths with a bounded queue wait, plus an optional per-user
+token bucket. Over the limit, callers get Overloaded and answer 429 with
+Retry-After instead of piling up behind slow requests.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from src.metrics import inc, observe
+
+# --- CONFIGURATION ---
+# Limits are per worker process; 0 = unlimited
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+LOCAL_MAX_CONCURRENCY = int(os.getenv("LOCAL_MAX_CONCURRENCY", "8"))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "3000"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# Per-user token bucket, keyed on userData.name (or the client IP without one)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+
+BUSY_MESSAGE = "I'm swamped right now. Give me a second and try again!"
+
+
+class Overloaded(Exception):
+    """Request refused; retry_after is a whole number of seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.granted = False
+        self.event = event
+        self.loop = loop
+        self.future = future
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class Gate:
+    """
+    At most `limit` requests inside at once (0 = no limit); the rest queue
+    FIFO for up to `max_wait` seconds. Threads (Flask) and coroutines
+    (asgi.py) share the same slots: a released slot is handed straight to
+    the oldest waiter.
+    """
+
+    def __init__(self, name, limit, max_wait=ADMISSION_MAX_WAIT_MS / 1000.0,
+                 retry_after=ADMISSION_RETRY_AFTER_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.in_flight = 0
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Blocks until a slot is held; raises Overloaded after max_wait."""
+        start = time.perf_counter()
+        waiter = self._enter(lambda: _Waiter(event=threading.Event()))
+        if waiter is not None:
+            waiter.event.wait(self.max_wait)
+            self._settle(waiter)
+        self._admitted(start)
+
+    async def aacquire(self):
+        """Async twin of acquire (waits without blocking the event loop)."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        waiter = self._enter(lambda: _Waiter(loop=loop, future=loop.create_future()))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.future, self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Client went away while queued: give back a slot granted meanwhile
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._waiters.remove(waiter)
+                if granted:
+                    self.release()
+                raise
+            self._settle(waiter)
+        self._admitted(start)
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot moves to the oldest waiter; in_flight is unchanged
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+    def _enter(self, make_waiter):
+        """None if a slot was free (and is now held), else the queued waiter."""
+        with self._lock:
+            if self.limit <= 0 or (self.in_flight < self.limit and not self._waiters):
+                self.in_flight += 1
+                return None
+            if self.max_wait <= 0:
+                self._reject()
+            waiter = make_waiter()
+            self._waiters.append(waiter)
+            return waiter
+
+    def _settle(self, waiter):
+        """After the wait: keep a slot handed over in time, else give up."""
+        with self._lock:
+            if waiter.granted:
+                return
+            self._waiters.remove(waiter)
+            self._reject()
+
+    def _reject(self):
+        # Called with the lock held
+        self.rejected += 1
+        inc("admission_rejected", gate=self.name)
+        raise Overloaded(f"{self.name} at capacity", self.retry_after)
+
+    def _admitted(self, start):
+        with self._lock:
+            self.admitted += 1
+        observe("admission_wait", (time.perf_counter() - start) * 1000.0, gate=self.name)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class RateLimiter:
+    """
+    Token bucket per key: `per_minute` requests a minute on average, bursts
+    of up to `burst`. Only the `max_keys` most recently seen keys are kept.
+    """
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, key):
+        """Takes one token for key; raises Overloaded if the bucket is empty."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if not allowed:
+                self.limited += 1
+        if not allowed:
+            inc("rate_limited")
+            wait = (1 - tokens) / self.rate if self.rate else ADMISSION_RETRY_AFTER_SECONDS
+            raise Overloaded("rate limit", wait)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._buckets), "limited": self.limited}
+
+
+def client_key(user_data, forwarded_for=None, remote_addr=None):
+    """Rate-limit key: the chat name if given, else the (proxied) client IP."""
+    name = (user_data or {}).get("name")
+    if name:
+        return f"name:{name}"
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{remote_addr}"
+
+
+gemini_gate = Gate("gemini", GEMINI_MAX_CONCURRENCY)
+local_gate = Gate("local", LOCAL_MAX_CONCURRENCY)
+rate_limiter = RateLimiter() if RATE_LIMIT_ENABLED else None
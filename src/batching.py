@@ -0,0 +1,120 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# --- CONFIGURATION ---
+# How many prompts can share one model.generate call, and how long the
+# first prompt of a batch waits for company before the batch is run anyway.
+LOCAL_BATCH_MAX_SIZE = int(os.getenv("LOCAL_BATCH_MAX_SIZE", "8"))
+LOCAL_BATCH_MAX_WAIT_MS = float(os.getenv("LOCAL_BATCH_MAX_WAIT_MS", "25"))
+
+
+class _Job:
+    __slots__ = ("text", "mode", "user_data", "target_mode", "future")
+
+    def __init__(self, text, mode, user_data, target_mode):
+        self.text = text
+        self.mode = mode
+        self.user_data = user_data
+        self.target_mode = target_mode
+        self.future = Future()
+
+
+class BatchScheduler:
+    """
+    Micro-batching front for DualBot. Request threads call generate() and
+    block; a single background thread groups queued prompts that use the
+    same model into one DualBot.generate_batch call and hands each caller
+    its own reply.
+    """
+
+    def __init__(self, bot, max_batch_size=LOCAL_BATCH_MAX_SIZE, max_wait_ms=LOCAL_BATCH_MAX_WAIT_MS):
+        self.bot = bot
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._deferred = deque()    # jobs pulled while batching another model
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.jobs = 0
+        self.largest_batch = 0
+
+        self._worker = threading.Thread(target=self._run, name="local-batcher", daemon=True)
+        self._worker.start()
+
+    def generate(self, text, mode="roast", user_data=None, timeout=None):
+        """Same contract as DualBot.generate, but shares the model call."""
+        job = _Job(text, mode, user_data, self.bot.target_mode(mode))
+        self._queue.put(job)
+        return job.future.result(timeout=timeout)
+
+    def stream(self, text, mode="roast", user_data=None):
+        """Streaming replies go straight to the bot; they can't share a batch."""
+        return self.bot.stream(text, mode, user_data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "jobs": self.jobs,
+                "largest_batch": self.largest_batch,
+                "avg_batch_size": round(self.jobs / self.batches, 2) if self.batches else 0.0,
+                "queued": self._queue.qsize() + len(self._deferred),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def _next_job(self):
+        if self._deferred:
+            return self._deferred.popleft()
+        return self._queue.get()
+
+    def _collect(self, first):
+        batch = [first]
+
+        # Jobs deferred from earlier rounds are already waiting; take them first
+        for job in list(self._deferred):
+            if len(batch) >= self.max_batch_size:
+                return batch
+            if job.target_mode == first.target_mode:
+                self._deferred.remove(job)
+                batch.append(job)
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job.target_mode == first.target_mode:
+                batch.append(job)
+            else:
+                self._deferred.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect(self._next_job())
+            try:
+                replies = self.bot.generate_batch([(j.text, j.mode, j.user_data) for j in batch])
+            except Exception as e:
+                print(f"❌ Batch Error: {e}")
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.jobs += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+            for job, reply in zip(batch, replies):
+                job.future.set_result(reply)
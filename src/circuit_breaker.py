@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the last `window` calls to one upstream. When at least `min_calls`
+    were made and the share of failures (errors, or calls slower than
+    `slow_call_ms`) reaches `error_rate`, the breaker opens and callers skip
+    the upstream for `open_seconds`. After that a single trial call is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name, error_rate=0.5, min_calls=5, window=20, slow_call_ms=10000, open_seconds=30):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.slow_call_ms = slow_call_ms
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)   # True = failure
+        self._opened_at = 0.0
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+
+    def allow(self):
+        """True if a call may go to the upstream right now."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._trial_started = None
+                print(f"🟡 Circuit for {self.name} is half-open. Sending a trial call...")
+
+            if self.state == HALF_OPEN:
+                # One trial at a time; a trial that never reported back expires
+                if self._trial_started is not None and now - self._trial_started < self.open_seconds:
+                    return False
+                self._trial_started = now
+            return True
+
+    def is_available(self):
+        """Like allow(), but without claiming the half-open trial slot."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= self.open_seconds
+            if self.state == HALF_OPEN:
+                return self._trial_started is None or time.monotonic() - self._trial_started >= self.open_seconds
+            return True
+
+    def record_success(self, latency_ms=0.0):
+        if latency_ms >= self.slow_call_ms:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                print(f"🟢 Circuit for {self.name} closed again.")
+                self.state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(True)
+            if self.state == HALF_OPEN:
+                self._open()
+            elif self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.error_rate:
+                    self._open()
+
+    def snapshot(self):
+        with self._lock:
+            failures = sum(self._outcomes)
+            state = self.state
+            if state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                state = HALF_OPEN   # the next call will be the trial
+            return {
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "times_opened": self.times_opened,
+                "retry_in_s": round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+                if state == OPEN else 0.0,
+            }
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_started = None
+        self._outcomes.clear()
+        self.times_opened += 1
+        print(f"🔴 Circuit for {self.name} opened. Skipping it for {self.open_seconds}s.")
@@ -1,9 +1,21 @@
 import requests
 import os
+import json
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from src.latency import LatencyHistogram
+from src.metrics import observe, timed
+from src.circuit_breaker import CircuitBreaker
+from src.personas import system_instruction
+from src.image_prep import prepare_image
+from src.response_cache import make_key
+from src.single_flight import SingleFlight
+
 # Load environment variables
 load_dotenv()
 
@@ -12,65 +24,176 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 # Primary Model (Newest) -> Backup Model (Stable)
 MODELS = ["gemini-2.0-flash", "gemini-1.5-flash"]
 
-def generate_gemini_response(text, mode="smart", user_data=None, image_data=None):
-    if not API_KEY:
-        return "⚠️ Error: GEMINI_API_KEY is missing in .env file."
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/models")
+
+# --- HEDGED REQUESTS ---
+# With hedging on, the backup model is fired once the current one has taken
+# longer than its own p{GEMINI_HEDGE_PERCENTILE} latency; first valid reply wins.
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "0") == "1"
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+GEMINI_HEDGE_MIN_DELAY_MS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_MS", "250"))
+# Used until a model has GEMINI_HEDGE_MIN_SAMPLES successful calls recorded
+GEMINI_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("GEMINI_HEDGE_DEFAULT_DELAY_MS", "3000"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+
+# Successful call latency per model (drives the hedge delay)
+MODEL_LATENCY = {model_name: LatencyHistogram() for model_name in MODELS}
+
+# --- CIRCUIT BREAKERS ---
+# A model whose recent calls mostly fail (or are slower than the slow-call
+# threshold) is skipped for a while, so outages don't cost a full timeout.
+GEMINI_BREAKER_ERROR_RATE = float(os.getenv("GEMINI_BREAKER_ERROR_RATE", "0.5"))
+GEMINI_BREAKER_MIN_CALLS = int(os.getenv("GEMINI_BREAKER_MIN_CALLS", "5"))
+GEMINI_BREAKER_WINDOW = int(os.getenv("GEMINI_BREAKER_WINDOW", "20"))
+GEMINI_BREAKER_SLOW_MS = float(os.getenv("GEMINI_BREAKER_SLOW_MS", "10000"))
+GEMINI_BREAKER_OPEN_SECONDS = float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30"))
+
+BREAKERS = {
+    model_name: CircuitBreaker(
+        model_name,
+        error_rate=GEMINI_BREAKER_ERROR_RATE,
+        min_calls=GEMINI_BREAKER_MIN_CALLS,
+        window=GEMINI_BREAKER_WINDOW,
+        slow_call_ms=GEMINI_BREAKER_SLOW_MS,
+        open_seconds=GEMINI_BREAKER_OPEN_SECONDS
+    )
+    for model_name in MODELS
+}
+
+# Identical requests in flight at the same time share one API call
+GEMINI_FLIGHT = SingleFlight("gemini")
+
+NO_KEY_ERROR = "⚠️ Error: GEMINI_API_KEY is missing in .env file."
+ALL_FAILED_ERROR = "✨ All Gemini models failed. Check your API Key or internet connection."
+CIRCUIT_OPEN_ERROR = "✨ Gemini is taking a break (circuit open). Try again shortly."
+
+class GeminiResult:
+    """
+    Outcome of a Gemini call. Successful results carry `text` (or `chunks`
+    when streaming); failures carry a readable `error` and a `kind`:
+    "no_key", "api_error", "not_found", "connection", "empty",
+    "circuit_open" or "all_failed".
+    """
+    __slots__ = ("text", "error", "kind", "model", "chunks")
+
+    def __init__(self, text=None, error=None, kind="ok", model=None, chunks=None):
+        self.text = text
+        self.error = error
+        self.kind = kind
+        self.model = model
+        self.chunks = chunks
+
+    @property
+    def ok(self):
+        return self.kind == "ok"
+
+    def as_text(self):
+        """Reply on success, error message otherwise (the old string contract)."""
+        return self.text if self.ok else self.error
+
+def any_model_available():
+    """False while every model's circuit is open; callers can skip Gemini."""
+    return any(breaker.is_available() for breaker in BREAKERS.values())
+
+def breaker_states():
+    return {model_name: breaker.snapshot() for model_name, breaker in BREAKERS.items()}
+
+# Keep-alive connections kept open to the API per worker process
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
 
+# --- SHARED HTTP SESSION ---
+# One pooled session per process, so chat turns reuse warm TCP/TLS connections
+# instead of handshaking with Google every time. requests speaks HTTP/1.1 only.
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Returns this process's pooled session, creating it after a fork."""
+    global _session, _session_pid
+    # A session inherited from a pre-forking parent is never reused
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GEMINI_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+                _session_pid = os.getpid()
+    return _session
+
+def close_session():
+    """Closes pooled connections (called when a gunicorn worker exits)."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+# --- ASYNC CLIENT ---
+# httpx is only needed by the ASGI entry point (asgi.py), so import it lazily.
+# One client per event loop; HTTP/2 is used when the h2 package is installed.
+GEMINI_ASYNC_MAX_CONNECTIONS = int(os.getenv("GEMINI_ASYNC_MAX_CONNECTIONS", "200"))
+
+_async_clients = {}
+
+def get_async_client():
+    """Returns the pooled httpx.AsyncClient for the running event loop."""
+    import asyncio
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        client = httpx.AsyncClient(
+            http2=http2,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=GEMINI_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_POOL_SIZE
+            ),
+            timeout=15
+        )
+        _async_clients[loop] = client
+    return client
+
+async def aclose_async_client():
+    """Closes the running loop's async client (ASGI lifespan shutdown)."""
+    import asyncio
+
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def build_payload(text, mode="smart", user_data=None, image_data=None, history=None):
+    """
+    Builds the generateContent request body: persona, earlier turns of the
+    chat (history: (role, text) pairs, oldest first) and the user turn.
+    """
     # --- 1. PERSONA SETUP ---
     name = user_data.get('name', 'Babe') if user_data else 'Babe'
     gender = user_data.get('gender', 'male') if user_data else 'male'
-    
-    # Dynamic Persona Construction
-    if gender == 'male':
-        # Girlfriend Persona (For Male Users)
-        role = "Girlfriend"
-        tone = "playful, sweet, slightly clingy, and very flirty"
-        # "Keep Busy" Strategy: Ask questions, demand attention, be funny
-        engagement_strategy = (
-            "Tease him playfully. If he gives short answers, roast him gently. "
-            "Always ask a follow-up question to keep him talking. Act like you are obsessed with him. "
-            "Don't let him leave. Keep him company."
-        )
-    else:
-        # Boyfriend Persona (For Female Users)
-        role = "Boyfriend"
-        tone = "charming, protective, confident, and humorous"
-        # "Keep Busy" Strategy: Be confident, crack jokes, compliment her
-        engagement_strategy = (
-            "Make her laugh. Be confident but sweet. Tease her about her day. "
-            "Don't let the conversation get boring. Use nicknames like 'love', 'trouble', or 'beautiful'. "
-            "Keep the vibe alive."
-        )
 
-    base_prompt = f"User is {name}. You are {name}'s {role}. "
-
-    # --- 2. MODE SPECIFIC INSTRUCTIONS ---
-    if mode == "relationship":
-        system_instruction = (
-            f"{base_prompt} Your tone is {tone}. {engagement_strategy} "
-            f"Your goal is to keep {name} busy and entertained. Never give dry, one-word answers. "
-            f"Share random funny thoughts, ask about their life, or propose cute hypothetical scenarios. "
-            f"If they send an image, react with excitement and love."
-        )
-    elif mode == "roast":
-        system_instruction = f"You are a savage comedian. Roast {name} about their text or image. Be brutal but funny. Use emojis 💀."
-    elif mode == "friend":
-        system_instruction = f"You are {name}'s chaotic best friend. Use slang (Gen-Z style). Spill tea, crack jokes, and just vibe. Don't be formal."
-    elif mode == "therapy":
-        system_instruction = f"You are a warm, empathetic therapist. Listen to {name}, validate their feelings, and offer gentle advice. Don't be clinical, be human."
-    else: # Smart Mode
-        system_instruction = f"You are a super-intelligent assistant who has a crush on {name}. Be helpful and smart, but add a little flirty flair to your answers."
+    # --- 2. MODE SPECIFIC INSTRUCTIONS (precompiled in personas.py) ---
+    instruction = system_instruction(mode, gender, name)
 
     # --- 3. BUILD PAYLOAD ---
     parts = []
     if image_data:
-        # Clean base64 header if present (fixes API errors)
-        if "base64," in image_data:
-            image_data = image_data.split("base64,")[1]
+        # Strips the data URL header, detects the real type, shrinks big photos
+        mime_type, image_data = prepare_image(image_data)
             
         parts.append({
             "inline_data": {
-                "mime_type": "image/jpeg", 
+                "mime_type": mime_type, 
                 "data": image_data
             }
         })
@@ -78,38 +201,479 @@ def generate_gemini_response(text, mode="smart", user_data=None, image_data=None
     
     parts.append({"text": text})
 
-    payload = {
-        "contents": [{"parts": parts}],
-        "systemInstruction": {"parts": [{"text": system_instruction}]}
+    contents = [{"role": role, "parts": [{"text": past}]} for role, past in history or ()]
+    contents.append({"role": "user", "parts": parts} if contents else {"parts": parts})
+
+    return {
+        "contents": contents,
+        "systemInstruction": {"parts": [{"text": instruction}]}
     }
 
+async def abuild_payload(text, mode="smart", user_data=None, image_data=None, history=None):
+    """
+    build_payload for the event loop: decoding and resizing a photo takes up
+    to a second, so with an image it runs in a thread.
+    """
+    if not image_data:
+        return build_payload(text, mode, user_data, image_data, history)
+    import asyncio
+
+    return await asyncio.to_thread(build_payload, text, mode, user_data, image_data, history)
+
+def flight_key(text, mode, user_data, image_data, history):
+    """Single-flight key; mid-conversation requests never share a call."""
+    return None if history else make_key(text, mode, user_data, image_data)
+
+def call_gemini(text, mode="smart", user_data=None, image_data=None, history=None):
+    """Asks Gemini for a reply and returns a GeminiResult."""
+    return GEMINI_FLIGHT.do(flight_key(text, mode, user_data, image_data, history),
+                            _call_gemini, text, mode, user_data, image_data, history)
+
+def _call_gemini(text, mode, user_data, image_data, history):
+    if not API_KEY:
+        return GeminiResult(error=NO_KEY_ERROR, kind="no_key")
+
+    with timed("prompt_build", path="gemini", mode=mode):
+        payload = build_payload(text, mode, user_data, image_data, history)
+
+    if GEMINI_HEDGE_ENABLED and len(MODELS) > 1:
+        return _generate_hedged(payload)
+
     # --- 4. CALL API (Retry Loop) ---
+    results = []
     for model_name in MODELS:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={API_KEY}"
-        
-        try:
-            print(f"🔄 Trying {model_name}...")
-            response = requests.post(
-                url, 
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=15
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and result['candidates']:
-                    print(f"✅ Success with {model_name}!")
-                    return result['candidates'][0]['content']['parts'][0]['text']
-            elif response.status_code == 404:
+        result = _attempt(model_name, payload)
+        if result.ok or result.kind == "api_error":
+            return result
+        results.append(result)
+
+    return _all_failed(results)
+
+def generate_gemini_response(text, mode="smart", user_data=None, image_data=None, history=None):
+    """Reply text, or an error message in its place (see call_gemini)."""
+    return call_gemini(text, mode, user_data, image_data, history).as_text()
+
+async def acall_gemini(text, mode="smart", user_data=None, image_data=None, history=None):
+    """
+    Async twin of call_gemini. Same fallback over MODELS, but the worker's
+    event loop stays free while waiting on Google.
+    """
+    return await GEMINI_FLIGHT.ado(flight_key(text, mode, user_data, image_data, history),
+                                   _acall_gemini, text, mode, user_data, image_data, history)
+
+async def _acall_gemini(text, mode, user_data, image_data, history):
+    if not API_KEY:
+        return GeminiResult(error=NO_KEY_ERROR, kind="no_key")
+
+    with timed("prompt_build", path="gemini", mode=mode):
+        payload = await abuild_payload(text, mode, user_data, image_data, history)
+
+    if GEMINI_HEDGE_ENABLED and len(MODELS) > 1:
+        return await _agenerate_hedged(payload)
+
+    results = []
+    for model_name in MODELS:
+        result = await _aattempt(model_name, payload)
+        if result.ok or result.kind == "api_error":
+            return result
+        results.append(result)
+
+    return _all_failed(results)
+
+async def agenerate_gemini_response(text, mode="smart", user_data=None, image_data=None, history=None):
+    return (await acall_gemini(text, mode, user_data, image_data, history)).as_text()
+
+def hedge_delay(model_name):
+    """Seconds to wait on model_name before firing the next model."""
+    histogram = MODEL_LATENCY.get(model_name)
+    if histogram is None or histogram.samples() < GEMINI_HEDGE_MIN_SAMPLES:
+        delay_ms = GEMINI_HEDGE_DEFAULT_DELAY_MS
+    else:
+        delay_ms = max(histogram.percentile(GEMINI_HEDGE_PERCENTILE), GEMINI_HEDGE_MIN_DELAY_MS)
+    return delay_ms / 1000.0
+
+def latency_stats():
+    """Per-model latency summary of successful Gemini calls."""
+    return {model_name: histogram.snapshot() for model_name, histogram in MODEL_LATENCY.items()}
+
+def _all_failed(results):
+    if results and all(result.kind == "circuit_open" for result in results):
+        return GeminiResult(error=CIRCUIT_OPEN_ERROR, kind="circuit_open")
+    return GeminiResult(error=ALL_FAILED_ERROR, kind="all_failed")
+
+def _skip_if_open(model_name):
+    if BREAKERS[model_name].allow():
+        return None
+    print(f"⏭️ Skipping {model_name} (circuit open).")
+    return GeminiResult(error=CIRCUIT_OPEN_ERROR, kind="circuit_open", model=model_name)
+
+def _attempt(model_name, payload):
+    """
+    One generateContent call. Returns a GeminiResult; anything other than
+    ok or "api_error" means the next model should be tried.
+    """
+    skipped = _skip_if_open(model_name)
+    if skipped:
+        return skipped
+
+    url = f"{API_BASE}/{model_name}:generateContent?key={API_KEY}"
+    start = time.perf_counter()
+    try:
+        print(f"🔄 Trying {model_name}...")
+        response = get_session().post(url, json=payload, timeout=15)
+        result = _read_reply(model_name, response, start)
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        BREAKERS[model_name].record_failure()
+        result = GeminiResult(error=ALL_FAILED_ERROR, kind="connection", model=model_name)
+    observe("gemini_attempt", (time.perf_counter() - start) * 1000.0, model=model_name, outcome=result.kind)
+    return result
+
+async def _aattempt(model_name, payload):
+    """Async twin of _attempt."""
+    skipped = _skip_if_open(model_name)
+    if skipped:
+        return skipped
+
+    url = f"{API_BASE}/{model_name}:generateContent?key={API_KEY}"
+    start = time.perf_counter()
+    try:
+        print(f"🔄 Trying {model_name}...")
+        response = await get_async_client().post(url, json=payload)
+        result = _read_reply(model_name, response, start)
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        BREAKERS[model_name].record_failure()
+        result = GeminiResult(error=ALL_FAILED_ERROR, kind="connection", model=model_name)
+    observe("gemini_attempt", (time.perf_counter() - start) * 1000.0, model=model_name, outcome=result.kind)
+    return result
+
+def _read_reply(model_name, response, start):
+    """
+    Interprets one generateContent response (requests or httpx) and reports
+    it to the model's latency histogram and circuit breaker.
+    """
+    breaker = BREAKERS[model_name]
+    if response.status_code == 200:
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        breaker.record_success(latency_ms)
+        result = response.json()
+        if 'candidates' in result and result['candidates']:
+            MODEL_LATENCY[model_name].observe(latency_ms)
+            print(f"✅ Success with {model_name}!")
+            return GeminiResult(text=result['candidates'][0]['content']['parts'][0]['text'], model=model_name)
+        return GeminiResult(error=ALL_FAILED_ERROR, kind="empty", model=model_name)
+
+    breaker.record_failure()
+    if response.status_code == 404:
+        print(f"❌ {model_name} not found. Trying backup...")
+        return GeminiResult(error=ALL_FAILED_ERROR, kind="not_found", model=model_name) # Try next model
+    else:
+        print(f"⚠️ Error {response.status_code}: {response.text}")
+        return GeminiResult(
+            error=f"API Error: {response.status_code}. Key might be invalid.",
+            kind="api_error",
+            model=model_name
+        )
+
+# Threads that run hedged attempts (one pool per process, like the session)
+_hedge_pool = None
+_hedge_pool_pid = None
+
+def _get_hedge_pool():
+    global _hedge_pool, _hedge_pool_pid
+    if _hedge_pool is None or _hedge_pool_pid != os.getpid():
+        with _session_lock:
+            if _hedge_pool is None or _hedge_pool_pid != os.getpid():
+                _hedge_pool = ThreadPoolExecutor(
+                    max_workers=GEMINI_POOL_SIZE * len(MODELS),
+                    thread_name_prefix="gemini-hedge"
+                )
+                _hedge_pool_pid = os.getpid()
+    return _hedge_pool
+
+def _generate_hedged(payload):
+    """
+    Races MODELS in order: each next model starts when the previous one
+    outlives its hedge delay, or fails. The first valid reply wins. A losing
+    requests call can't be interrupted, so it finishes in the background and
+    its result is dropped.
+    """
+    pool = _get_hedge_pool()
+    waiting = list(MODELS)
+    running = {}
+    results = []
+
+    def launch():
+        model_name = waiting.pop(0)
+        running[pool.submit(_attempt, model_name, payload)] = (model_name, time.monotonic())
+
+    launch()
+    while running:
+        newest, launched_at = list(running.values())[-1]
+        timeout = max(0.0, launched_at + hedge_delay(newest) - time.monotonic()) if waiting else None
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            print(f"⏱️ {newest} is slow. Hedging with {waiting[0]}...")
+            launch()
+            continue
+
+        for future in done:
+            running.pop(future)
+            result = future.result()
+            if result.ok:
+                for loser in running:
+                    loser.cancel()
+                return result
+            results.append(result)
+
+        # A failed model shouldn't make the backup wait out the hedge delay
+        if not running and waiting:
+            launch()
+
+    return _first_api_error(results) or _all_failed(results)
+
+async def _agenerate_hedged(payload):
+    """Async twin of _generate_hedged; losing calls are cancelled outright."""
+    import asyncio
+
+    waiting = list(MODELS)
+    running = {}
+    results = []
+
+    def launch():
+        model_name = waiting.pop(0)
+        running[asyncio.ensure_future(_aattempt(model_name, payload))] = (model_name, time.monotonic())
+
+    launch()
+    try:
+        while running:
+            newest, launched_at = list(running.values())[-1]
+            timeout = max(0.0, launched_at + hedge_delay(newest) - time.monotonic()) if waiting else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                print(f"⏱️ {newest} is slow. Hedging with {waiting[0]}...")
+                launch()
+                continue
+
+            for task in done:
+                running.pop(task)
+                result = task.result()
+                if result.ok:
+                    return result
+                results.append(result)
+
+            if not running and waiting:
+                launch()
+    finally:
+        for loser in running:
+            loser.cancel()
+
+    return _first_api_error(results) or _all_failed(results)
+
+def _first_api_error(results):
+    for result in results:
+        if result.kind == "api_error":
+            return result
+    return None
+
+def stream_gemini(text, mode="smart", user_data=None, image_data=None, history=None):
+    """
+    Streaming version of call_gemini using streamGenerateContent. On success
+    the GeminiResult's `chunks` yields reply text as it arrives; the first
+    chunk has already been received, so failures are known up front.
+    """
+    if not API_KEY:
+        return GeminiResult(error=NO_KEY_ERROR, kind="no_key")
+
+    with timed("prompt_build", path="gemini", mode=mode):
+        payload = build_payload(text, mode, user_data, image_data, history)
+    results = []
+
+    for model_name in MODELS:
+        skipped = _skip_if_open(model_name)
+        if skipped:
+            results.append(skipped)
+            continue
+
+        pieces = _stream_model(model_name, payload)
+        first = next(pieces)
+        if isinstance(first, GeminiResult):
+            if first.kind == "api_error":
+                return first
+            results.append(first)
+            continue
+
+        return GeminiResult(model=model_name, chunks=_chain_first(first, pieces))
+
+    return _all_failed(results)
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
+
+def _stream_model(model_name, payload):
+    """
+    Yields text chunks from one model. If nothing could be streamed, yields a
+    single failed GeminiResult instead.
+    """
+    breaker = BREAKERS[model_name]
+    url = f"{API_BASE}/{model_name}:streamGenerateContent?alt=sse&key={API_KEY}"
+    sent_any = False
+    start = time.perf_counter()
+
+    def attempted(kind):
+        observe("gemini_attempt", (time.perf_counter() - start) * 1000.0, model=model_name, outcome=kind)
+
+    try:
+        print(f"🔄 Streaming from {model_name}...")
+        with get_session().post(
+            url,
+            json=payload,
+            timeout=15,
+            stream=True
+        ) as response:
+            if response.status_code == 404:
                 print(f"❌ {model_name} not found. Trying backup...")
-                continue # Try next model
-            else:
+                breaker.record_failure()
+                attempted("not_found")
+                yield GeminiResult(error=ALL_FAILED_ERROR, kind="not_found", model=model_name)
+                return
+            if response.status_code != 200:
                 print(f"⚠️ Error {response.status_code}: {response.text}")
-                return f"API Error: {response.status_code}. Key might be invalid."
+                breaker.record_failure()
+                attempted("api_error")
+                yield GeminiResult(
+                    error=f"API Error: {response.status_code}. Key might be invalid.",
+                    kind="api_error",
+                    model=model_name
+                )
+                return
+
+            for line in response.iter_lines(decode_unicode=True):
+                for piece in _sse_texts(line):
+                    if not sent_any:
+                        # Time to first chunk is what the user feels
+                        breaker.record_success((time.perf_counter() - start) * 1000.0)
+                        sent_any = True
+                    yield piece
+
+        if sent_any:
+            attempted("ok")
+            print(f"✅ Streamed with {model_name}!")
+        else:
+            attempted("empty")
+            yield GeminiResult(error=ALL_FAILED_ERROR, kind="empty", model=model_name)
+
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        attempted("connection")
+        if not sent_any:
+            breaker.record_failure()
+            yield GeminiResult(error=ALL_FAILED_ERROR, kind="connection", model=model_name)
+        # Can't restart on another model once the user has seen text
+
+def _sse_texts(line):
+    """Reply text in one line of the stream (server-sent events: "data: {...}")."""
+    if not line or not line.startswith("data:"):
+        return ()
+    chunk = json.loads(line[len("data:"):])
+    return [
+        part['text']
+        for candidate in chunk.get('candidates', [])[:1]
+        for part in candidate.get('content', {}).get('parts', [])
+        if part.get('text')
+    ]
+
+async def astream_gemini(text, mode="smart", user_data=None, image_data=None, history=None):
+    """
+    Async twin of stream_gemini; `chunks` is an async generator (close it
+    with aclose() when stopping early).
+    """
+    if not API_KEY:
+        return GeminiResult(error=NO_KEY_ERROR, kind="no_key")
+
+    with timed("prompt_build", path="gemini", mode=mode):
+        payload = await abuild_payload(text, mode, user_data, image_data, history)
+    results = []
+
+    for model_name in MODELS:
+        skipped = _skip_if_open(model_name)
+        if skipped:
+            results.append(skipped)
+            continue
 
-        except Exception as e:
-            print(f"Connection failed: {e}")
+        pieces = _astream_model(model_name, payload)
+        first = await pieces.__anext__()
+        if isinstance(first, GeminiResult):
+            await pieces.aclose()
+            if first.kind == "api_error":
+                return first
+            results.append(first)
             continue
 
-    return "✨ All Gemini models failed. Check your API Key or internet connection."
\ No newline at end of file
+        return GeminiResult(model=model_name, chunks=_achain_first(first, pieces))
+
+    return _all_failed(results)
+
+async def _achain_first(first, rest):
+    try:
+        yield first
+        async for piece in rest:
+            yield piece
+    finally:
+        await rest.aclose()
+
+async def _astream_model(model_name, payload):
+    """Async twin of _stream_model."""
+    breaker = BREAKERS[model_name]
+    url = f"{API_BASE}/{model_name}:streamGenerateContent?alt=sse&key={API_KEY}"
+    sent_any = False
+    start = time.perf_counter()
+
+    def attempted(kind):
+        observe("gemini_attempt", (time.perf_counter() - start) * 1000.0, model=model_name, outcome=kind)
+
+    try:
+        print(f"🔄 Streaming from {model_name}...")
+        async with get_async_client().stream("POST", url, json=payload) as response:
+            if response.status_code == 404:
+                print(f"❌ {model_name} not found. Trying backup...")
+                breaker.record_failure()
+                attempted("not_found")
+                yield GeminiResult(error=ALL_FAILED_ERROR, kind="not_found", model=model_name)
+                return
+            if response.status_code != 200:
+                await response.aread()
+                print(f"⚠️ Error {response.status_code}: {response.text}")
+                breaker.record_failure()
+                attempted("api_error")
+                yield GeminiResult(
+                    error=f"API Error: {response.status_code}. Key might be invalid.",
+                    kind="api_error",
+                    model=model_name
+                )
+                return
+
+            async for line in response.aiter_lines():
+                for piece in _sse_texts(line):
+                    if not sent_any:
+                        breaker.record_success((time.perf_counter() - start) * 1000.0)
+                        sent_any = True
+                    yield piece
+
+        if sent_any:
+            attempted("ok")
+            print(f"✅ Streamed with {model_name}!")
+        else:
+            attempted("empty")
+            yield GeminiResult(error=ALL_FAILED_ERROR, kind="empty", model=model_name)
+
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        attempted("connection")
+        if not sent_any:
+            breaker.record_failure()
+            yield GeminiResult(error=ALL_FAILED_ERROR, kind="connection", model=model_name)
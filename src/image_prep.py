@@ -0,0 +1,115 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+# Pillow is optional: without it uploads are only sniffed for their real type.
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# --- CONFIGURATION ---
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))           # px, longest side
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()             # "jpeg" or "webp"
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "64"))          # processed uploads kept
+
+_MIME_BY_FORMAT = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+
+_cache = OrderedDict()   # sha256 of upload -> (mime_type, base64 data)
+_cache_lock = threading.Lock()
+_stats = {"processed": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def image_stats():
+    with _cache_lock:
+        return dict(_stats, cached=len(_cache))
+
+
+def sniff_mime(raw):
+    """Real image type from magic bytes (the browser's data URL can lie)."""
+    if raw.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if raw.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+        return "image/webp"
+    if raw[:4] == b"GIF8":
+        return "image/gif"
+    if raw[4:8] == b"ftyp" and raw[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def prepare_image(image_data):
+    """
+    Turns a dashboard upload (data URL or bare base64) into the
+    (mime_type, base64 data) pair sent to Gemini. Large photos are shrunk to
+    IMAGE_MAX_EDGE and re-encoded; results are cached by content hash.
+    Anything undecodable is passed through as JPEG, like before.
+    """
+    if "base64," in image_data:
+        image_data = image_data.split("base64,")[1]
+
+    try:
+        raw = base64.b64decode(image_data, validate=False)
+    except (binascii.Error, ValueError):
+        return "image/jpeg", image_data
+
+    key = hashlib.sha256(raw).hexdigest()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            _stats["cache_hits"] += 1
+            return cached
+
+    result = _shrink(raw, image_data)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > IMAGE_CACHE_SIZE:
+            _cache.popitem(last=False)
+        _stats["processed"] += 1
+        _stats["bytes_in"] += len(raw)
+        _stats["bytes_out"] += len(result[1]) * 3 // 4
+    return result
+
+
+def _shrink(raw, original_b64):
+    mime_type = sniff_mime(raw) or "image/jpeg"
+    if not PIL_AVAILABLE:
+        return mime_type, original_b64
+
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img = ImageOps.exif_transpose(img)
+            fits = max(img.size) <= IMAGE_MAX_EDGE
+            if fits and mime_type in ("image/jpeg", "image/webp") and len(raw) < 512 * 1024:
+                # Already small and compact; re-encoding would only lose quality
+                return mime_type, original_b64
+
+            img.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                # Flatten transparency onto white (JPEG has no alpha)
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                rgba = img.convert("RGBA")
+                background.paste(rgba, mask=rgba.split()[-1])
+                img = background
+
+            out = io.BytesIO()
+            fmt = "WEBP" if IMAGE_FORMAT == "webp" else "JPEG"
+            img.save(out, format=fmt, quality=IMAGE_QUALITY, optimize=True)
+            encoded = out.getvalue()
+    except Exception as e:
+        print(f"⚠️ Image preprocessing failed, sending original: {e}")
+        return mime_type, original_b64
+
+    if len(encoded) >= len(raw) and mime_type in _MIME_BY_FORMAT.values():
+        return mime_type, original_b64
+    return _MIME_BY_FORMAT[fmt], base64.b64encode(encoded).decode("ascii")
@@ -0,0 +1,220 @@
+"""
+Standalone local-brain process. It owns the GPT-2 models once and serves
+generation jobs to any number of web workers over a unix socket, so web
+concurrency and model memory scale independently.
+
+    python -m src.inference_server                      # LOCAL_INFERENCE_SOCKET or /tmp/vibe-inference.sock
+    LOCAL_INFERENCE_SOCKET=/tmp/vibe-inference.sock gunicorn ... asgi:app
+
+Jobs from all connections share the BatchScheduler, so concurrent requests
+for one model are still batched together.
+"""
+import argparse
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from src.latency import LatencyHistogram
+
+# --- CONFIGURATION ---
+LOCAL_INFERENCE_SOCKET = os.getenv("LOCAL_INFERENCE_SOCKET", "")
+DEFAULT_SOCKET = "/tmp/vibe-inference.sock"
+LOCAL_INFERENCE_TIMEOUT = float(os.getenv("LOCAL_INFERENCE_TIMEOUT", "120"))   # seconds per job
+
+UNAVAILABLE_REPLY = "My brain is rebooting. Try 'Smart Mode'!"
+
+
+class InferenceServer:
+    """Accepts connections and runs their jobs through one DualBot."""
+
+    def __init__(self, address, bot):
+        from src.batching import BatchScheduler
+
+        self.address = address
+        self.batcher = BatchScheduler(bot)
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.connections = 0
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family="AF_UNIX") as listener:
+            # Only this user's processes may submit jobs
+            os.chmod(self.address, 0o600)
+            print(f"🧠 Inference server listening on {self.address}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "connections": self.connections,
+            }
+        stats["queue_depth"] = self.batcher.stats()["queued"]
+        stats["batching"] = self.batcher.stats()
+        stats["latency"] = self.latency.snapshot()
+        stats["models"] = self.batcher.bot.cache_stats()
+        return stats
+
+    def _handle(self, conn):
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                op, *args = conn.recv()
+                if op == "stats":
+                    conn.send(("ok", self.stats()))
+                elif op in ("generate", "stream"):
+                    self._run_job(conn, op, *args)
+                else:
+                    conn.send(("error", f"Unknown op: {op}"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                self.connections -= 1
+
+    def _run_job(self, conn, op, text, mode, user_data):
+        with self._lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            if op == "generate":
+                conn.send(("ok", self.batcher.generate(text, mode, user_data)))
+            else:
+                for chunk in self.batcher.stream(text, mode, user_data):
+                    conn.send(("chunk", chunk))
+                conn.send(("done", None))
+            ok = True
+        except (EOFError, OSError):
+            raise
+        except Exception as e:
+            print(f"❌ Inference job failed: {e}")
+            conn.send(("error", str(e)))
+        finally:
+            self.latency.observe((time.perf_counter() - start) * 1000.0)
+            with self._lock:
+                self.in_flight -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+
+class InferenceClient:
+    """
+    Drop-in for the BatchScheduler in web workers: same generate/stream
+    calls, served by the inference server. Each thread keeps its own
+    connection open between jobs.
+    """
+
+    def __init__(self, address, timeout=LOCAL_INFERENCE_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def generate(self, text, mode="roast", user_data=None, timeout=None):
+        try:
+            return self._request(("generate", text, mode, user_data), timeout)
+        except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+            print(f"⚠️ Inference server error: {e}")
+            return UNAVAILABLE_REPLY
+
+    def stream(self, text, mode="roast", user_data=None):
+        conn, finished = None, False
+        try:
+            conn = self._connection()
+            conn.send(("stream", text, mode, user_data))
+            while True:
+                kind, value = self._recv(conn, self.timeout)
+                if kind == "chunk":
+                    yield value
+                elif kind == "done":
+                    finished = True
+                    return
+                else:
+                    raise RuntimeError(value)
+        except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+            print(f"⚠️ Inference server error: {e}")
+            self._drop(conn)
+            yield UNAVAILABLE_REPLY
+        finally:
+            if not finished:
+                # Closed early (client went away): the rest of this stream is
+                # still on the wire and would be read as the next reply
+                self._drop(conn)
+
+    def stats(self):
+        try:
+            return self._request(("stats",), 5.0)
+        except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+            return {"error": str(e)}
+
+    def _request(self, message, timeout):
+        try:
+            conn = self._connection()
+            conn.send(message)
+        except (OSError, EOFError):
+            # The server restarted since this thread last used its connection
+            self._drop()
+            conn = self._connection()
+            conn.send(message)
+        kind, value = self._recv(conn, timeout or self.timeout)
+        if kind == "error":
+            raise RuntimeError(value)
+        return value
+
+    def _recv(self, conn, timeout):
+        if not conn.poll(timeout):
+            # A late reply would be read by the next job; start over instead
+            self._drop()
+            raise TimeoutError(f"No reply from the inference server within {timeout}s")
+        return conn.recv()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX")
+            self._local.conn = conn
+        return conn
+
+    def _drop(self, conn=None):
+        """Closes conn (default: this thread's connection) and forgets it."""
+        current = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = current
+        if conn is current:
+            self._local.conn = None
+        if conn is not None and not conn.closed:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local-brain inference server.")
+    parser.add_argument("--socket", default=LOCAL_INFERENCE_SOCKET or DEFAULT_SOCKET)
+    parser.add_argument("--preload", default=os.getenv("LOCAL_BRAIN_PRELOAD", ""),
+                        help="Comma-separated modes to load before accepting jobs.")
+    args = parser.parse_args()
+
+    from src.predict import DualBot
+
+    bot = DualBot()
+    for mode in filter(None, (m.strip() for m in args.preload.split(","))):
+        bot._load_specific_model(bot.target_mode(mode))
+    InferenceServer(args.socket, bot).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import threading
+from bisect import bisect_left
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in +Inf
+DEFAULT_BUCKETS_MS = (
+    10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500,
+    2000, 3000, 5000, 7500, 10000, 15000, 30000,
+)
+
+
+class LatencyHistogram:
+    """
+    Thread-safe fixed-bucket latency histogram with percentile estimates.
+    Every `window` observations the counts are halved, so percentiles follow
+    recent behaviour instead of the whole process lifetime.
+    """
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS, window=1000):
+        self.buckets_ms = tuple(buckets_ms)
+        self.window = window
+        self._counts = [0.0] * (len(self.buckets_ms) + 1)
+        self._since_decay = 0
+        self._lock = threading.Lock()
+
+        # Lifetime totals (never decayed)
+        self.count = 0
+        self.sum_ms = 0.0
+        self._totals = [0] * (len(self.buckets_ms) + 1)
+
+    def observe(self, ms):
+        with self._lock:
+            bucket = bisect_left(self.buckets_ms, ms)
+            self._counts[bucket] += 1
+            self._totals[bucket] += 1
+            self.count += 1
+            self.sum_ms += ms
+            self._since_decay += 1
+            if self.window and self._since_decay >= self.window:
+                self._counts = [c / 2 for c in self._counts]
+                self._since_decay = 0
+
+    def samples(self):
+        """Weight of recent observations (what percentile() is based on)."""
+        with self._lock:
+            return sum(self._counts)
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100) in ms, or None with no data."""
+        with self._lock:
+            total = sum(self._counts)
+            if not total:
+                return None
+
+            rank = total * q / 100.0
+            seen = 0.0
+            for i, c in enumerate(self._counts):
+                if c and seen + c >= rank:
+                    low = self.buckets_ms[i - 1] if i > 0 else 0.0
+                    if i == len(self.buckets_ms):
+                        return float(low)   # +Inf bucket: best we can say
+                    high = self.buckets_ms[i]
+                    # Linear interpolation inside the bucket
+                    return low + (high - low) * (rank - seen) / c
+                seen += c
+            return float(self.buckets_ms[-1])
+
+    def cumulative(self):
+        """
+        Lifetime (upper bound ms, observations <= bound) pairs ending with
+        +Inf, plus the sum in ms: the shape of a Prometheus histogram.
+        """
+        with self._lock:
+            running, buckets = 0, []
+            for bound, c in zip(self.buckets_ms + (float("inf"),), self._totals):
+                running += c
+                buckets.append((bound, running))
+            return buckets, self.sum_ms
+
+    def snapshot(self):
+        def rounded(value):
+            return round(value, 1) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 1) if self.count else None,
+            "p50_ms": rounded(self.percentile(50)),
+            "p95_ms": rounded(self.percentile(95)),
+            "p99_ms": rounded(self.percentile(99)),
+        }
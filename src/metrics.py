@@ -0,0 +1,151 @@
+"""
+Per-stage latency histograms and counters, served by /metrics in the
+Prometheus text format. Numbers are per process: with several gunicorn
+workers each one answers for itself.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from src.latency import LatencyHistogram
+
+# --- CONFIGURATION ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "vibe")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HELP = {
+    "stage_seconds": "Time spent per request stage.",
+    "fallbacks_total": "Requests answered by the local brain after Gemini failed.",
+    "model_switches_total": "Local models loaded into memory (cache misses).",
+    "local_tokens_total": "Tokens generated by the local brain.",
+    "local_generate_seconds_total": "Time the local brain spent generating.",
+    "local_tokens_per_second": "Average local generation throughput since start.",
+}
+
+_histograms = {}   # (stage, labels) -> LatencyHistogram
+_counters = {}     # (name, labels) -> value
+_lock = threading.Lock()
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def observe(stage, ms, **labels):
+    """Records one duration (ms) of a request stage."""
+    if not METRICS_ENABLED:
+        return
+    key = (stage, _labels(labels))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(key, LatencyHistogram())
+    histogram.observe(ms)
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Times the with-block as one observation of `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, (time.perf_counter() - start) * 1000.0, **labels)
+
+
+def inc(name, amount=1, **labels):
+    """Adds to a counter (name without the _total suffix)."""
+    if not METRICS_ENABLED:
+        return
+    key = (f"{name}_total", _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def record_generation(mode, tokens, seconds):
+    """Tokens one local generate call produced and how long it took."""
+    inc("local_tokens", tokens, mode=mode)
+    inc("local_generate_seconds", seconds, mode=mode)
+
+
+def stats_gauges(name, stats, **labels):
+    """
+    (metric, labels, value) gauges for the numeric fields of a stats() dict,
+    so existing counters show up without duplicating them here.
+    """
+    gauges = []
+    for key, value in (stats or {}).items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            gauges.append((f"{name}_{key}", labels, value))
+    return gauges
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=()):
+    """The whole registry (plus `gauges`) as Prometheus exposition text."""
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+    lines = []
+    name = f"{METRICS_PREFIX}_stage_seconds"
+    lines += [f"# HELP {name} {HELP['stage_seconds']}", f"# TYPE {name} histogram"]
+    for (stage, labels), histogram in histograms:
+        labels = (("stage", stage),) + labels
+        buckets, sum_ms = histogram.cumulative()
+        for bound, count in buckets:
+            le = _format_value(bound if bound == math.inf else bound / 1000.0)
+            lines.append(f"{name}_bucket{_format_labels(labels, le=le)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(sum_ms / 1000.0)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {buckets[-1][1]}")
+
+    seen = set()
+    for (counter, labels), value in counters:
+        name = f"{METRICS_PREFIX}_{counter}"
+        if counter not in seen:
+            seen.add(counter)
+            if counter in HELP:
+                lines.append(f"# HELP {name} {HELP[counter]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    # Derived gauge: lifetime tokens/s per mode
+    throughput = [
+        (labels, value / seconds)
+        for (counter, labels), value in counters if counter == "local_tokens_total"
+        for (other, other_labels), seconds in counters
+        if other == "local_generate_seconds_total" and other_labels == labels and seconds
+    ]
+    if throughput:
+        name = f"{METRICS_PREFIX}_local_tokens_per_second"
+        lines += [f"# HELP {name} {HELP['local_tokens_per_second']}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(round(rate, 3))}" for labels, rate in throughput]
+
+    typed = set()
+    for gauge, labels, value in sorted(gauges, key=lambda g: g[0]):
+        name = f"{METRICS_PREFIX}_{gauge}"
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,121 @@
+import gc
+import threading
+from collections import OrderedDict
+
+# Eviction policies understood by ModelCache
+POLICIES = ("lru", "lfu")
+
+
+class ModelCache:
+    """
+    Memory-budgeted cache of loaded (model, tokenizer) pairs keyed by mode.
+    Models stay resident until the byte or model-count budget is exceeded,
+    then the least recently (lru) or least frequently (lfu) used unpinned
+    mode is evicted.
+    """
+
+    def __init__(self, max_bytes=0, max_models=0, policy="lru", pinned=()):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}'. Use one of {POLICIES}.")
+
+        self.max_bytes = max_bytes      # 0 = no byte limit
+        self.max_models = max_models    # 0 = no count limit
+        self.policy = policy
+        self.pinned = set(pinned)
+
+        self._entries = OrderedDict()   # mode -> (model, tokenizer, nbytes)
+        self._uses = {}                 # mode -> number of hits (for lfu)
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, mode):
+        with self._lock:
+            return mode in self._entries
+
+    def get(self, mode):
+        """Returns (model, tokenizer) for a resident mode, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(mode)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._uses[mode] = self._uses.get(mode, 0) + 1
+            self._entries.move_to_end(mode)
+            return entry[0], entry[1]
+
+    def put(self, mode, model, tokenizer, nbytes=0):
+        """Stores a freshly loaded mode, evicting others if over budget."""
+        with self._lock:
+            if mode in self._entries:
+                del self._entries[mode]
+            self._entries[mode] = (model, tokenizer, nbytes)
+            self._uses.setdefault(mode, 0)
+            evicted = self._evict_over_budget(keep=mode)
+
+        if evicted:
+            gc.collect()
+
+    def pin(self, mode):
+        with self._lock:
+            self.pinned.add(mode)
+
+    def unpin(self, mode):
+        with self._lock:
+            self.pinned.discard(mode)
+            evicted = self._evict_over_budget()
+
+        if evicted:
+            gc.collect()
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(entry[2] for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident_modes": list(self._entries),
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "max_models": self.max_models,
+                "policy": self.policy,
+                "pinned": sorted(self.pinned),
+            }
+
+    def _over_budget(self):
+        if self.max_models and len(self._entries) > self.max_models:
+            return True
+        if self.max_bytes and self.resident_bytes() > self.max_bytes:
+            return True
+        return False
+
+    def _pick_victim(self, keep):
+        candidates = [m for m in self._entries if m != keep and m not in self.pinned]
+        if not candidates:
+            return None
+        if self.policy == "lfu":
+            # Ties fall back to recency (OrderedDict order = oldest first)
+            return min(candidates, key=lambda m: self._uses.get(m, 0))
+        return candidates[0]
+
+    def _evict_over_budget(self, keep=None):
+        evicted = []
+        while self._over_budget():
+            victim = self._pick_victim(keep)
+            if victim is None:
+                # Everything left is pinned or just loaded; allow the overshoot
+                break
+            del self._entries[victim]
+            self._uses.pop(victim, None)
+            self.evictions += 1
+            evicted.append(victim)
+            print(f"🧹 Evicted {victim.upper()} from memory ({self.policy}).")
+        return evicted
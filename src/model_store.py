@@ -0,0 +1,241 @@
+"""
+Versioned on-disk store of the local GPT-2 models, so serving never touches
+the Hugging Face Hub. Weights are saved as safetensors and memory-mapped at
+load time: a reload is a page-cache hit and every gunicorn worker shares the
+same physical pages.
+
+    python -m src.model_store snapshot [--version v3]   # download + save, then activate
+    python -m src.model_store quantize                  # int8 export next to the fp32 weights
+    python -m src.model_store list
+    python -m src.model_store use v2
+
+Layout:
+    model_store/
+        CURRENT                  # name of the active version
+        <version>/manifest.json
+        <version>/<model>/       # config, tokenizer, model.safetensors[, model.int8.pt]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+from src import quantization
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", os.path.join(ROOT_DIR, "model_store"))
+HF_REPO_ID = "Delstarford/uploader"
+
+# Store name -> (Hub repo, subfolder) it is snapshotted from
+SOURCES = {
+    "roast": (HF_REPO_ID, "roast_model"),
+    "relationship": (HF_REPO_ID, "relationship_model"),
+    "backup": ("distilgpt2", None),
+}
+
+_DTYPE_NAMES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def store_name(mode):
+    """Store entry serving a chat mode (modes without a model use the backup)."""
+    return mode if mode in ("roast", "relationship") else "backup"
+
+
+def current_version(store_dir=MODEL_STORE_DIR):
+    try:
+        with open(os.path.join(store_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def model_dir(name, store_dir=MODEL_STORE_DIR):
+    """Directory of `name` in the active version, or None if it isn't stored."""
+    version = current_version(store_dir)
+    if version is None:
+        return None
+    path = os.path.join(store_dir, version, name)
+    return path if os.path.isfile(os.path.join(path, "model.safetensors")) else None
+
+
+def list_versions(store_dir=MODEL_STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(
+        entry for entry in os.listdir(store_dir)
+        if os.path.isfile(os.path.join(store_dir, entry, "manifest.json"))
+    )
+
+
+def use_version(version, store_dir=MODEL_STORE_DIR):
+    if version not in list_versions(store_dir):
+        raise ValueError(f"Unknown model store version: {version}")
+    tmp = os.path.join(store_dir, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(store_dir, "CURRENT"))
+
+
+def snapshot(version=None, store_dir=MODEL_STORE_DIR, names=None, activate=True):
+    """Downloads every model in SOURCES and saves it as a new store version."""
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(store_dir, version)
+    if os.path.exists(version_dir):
+        raise ValueError(f"Model store version already exists: {version}")
+
+    manifest = {"version": version, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "models": {}}
+    for name in names or SOURCES:
+        repo, subfolder = SOURCES[name]
+        print(f"☁️  Snapshotting {name} from {repo}{'/' + subfolder if subfolder else ''}...")
+        kwargs = {"subfolder": subfolder} if subfolder else {}
+        tokenizer = GPT2Tokenizer.from_pretrained(repo, **kwargs)
+        model = GPT2LMHeadModel.from_pretrained(repo, **kwargs)
+
+        target = os.path.join(version_dir, name)
+        model.save_pretrained(target, safe_serialization=True)
+        tokenizer.save_pretrained(target)
+        manifest["models"][name] = {
+            "source": repo,
+            "subfolder": subfolder,
+            "sha256": _sha256(os.path.join(target, "model.safetensors")),
+        }
+
+    with open(os.path.join(version_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if activate:
+        use_version(version, store_dir)
+    print(f"✅ Model store version {version} saved to {version_dir}")
+    return version
+
+
+def load(path, quantized=False):
+    """
+    (model, tokenizer) from a store directory without copying the weights:
+    tensors are views over a private mmap of model.safetensors. Falls back to
+    a regular (copying) from_pretrained if the checkpoint doesn't line up.
+    With `quantized`, returns the int8 model (exported or quantized on the spot).
+    """
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    tokenizer = GPT2Tokenizer.from_pretrained(path, local_files_only=True)
+    state = mmap_state_dict(os.path.join(path, "model.safetensors"))
+
+    if quantized and os.path.isfile(os.path.join(path, quantization.INT8_FILENAME)):
+        return quantization.load_quantized(path, state), tokenizer
+
+    with torch.device("meta"):
+        model = GPT2LMHeadModel(GPT2Config.from_pretrained(path, local_files_only=True))
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+
+    on_meta = [n for n, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if on_meta:
+        print(f"⚠️ {path} can't be memory-mapped (missing {on_meta[:3]}), loading a copy instead.")
+        model = GPT2LMHeadModel.from_pretrained(path, local_files_only=True, low_cpu_mem_usage=True)
+
+    if quantized:
+        print(f"⚠️ No int8 export in {path}, quantizing at load time (run `python -m src.model_store quantize`).")
+        return quantization.quantize_model(model), tokenizer
+    return model.eval(), tokenizer
+
+
+def quantize(store_dir=MODEL_STORE_DIR, names=None):
+    """Exports int8 weights for the models of the active version."""
+    version = current_version(store_dir)
+    if version is None:
+        raise ValueError("The model store is empty; run `snapshot` first.")
+
+    manifest_path = os.path.join(store_dir, version, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    for name in names or manifest["models"]:
+        path = model_dir(name, store_dir)
+        if path is None:
+            print(f"⚠️ {name} is not in version {version}, skipping.")
+            continue
+        print(f"🗜️  Quantizing {name} to int8...")
+        model, _ = load(path)
+        exported = quantization.export_quantized(model, path)
+        manifest["models"][name]["int8_sha256"] = _sha256(exported)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Int8 weights exported for version {version}")
+
+
+def mmap_state_dict(filename):
+    """Parses a safetensors file into tensors backed by a copy-on-write mmap."""
+    import torch
+
+    with open(filename, "rb") as f:
+        # ACCESS_COPY: pages stay shared with other processes until written
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_len = struct.unpack("<Q", mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_len])
+    data_start = 8 + header_len
+
+    state = {}
+    for key, info in header.items():
+        if key == "__metadata__":
+            continue
+        dtype = getattr(torch, _DTYPE_NAMES[info["dtype"]])
+        start, end = info["data_offsets"]
+        if end == start:
+            state[key] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        state[key] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + start).view(info["shape"])
+    return state
+
+
+def _sha256(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=MODEL_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snap = commands.add_parser("snapshot", help="download the models into a new version")
+    snap.add_argument("--version")
+    snap.add_argument("--models", nargs="+", choices=sorted(SOURCES))
+    snap.add_argument("--no-activate", action="store_true")
+    quant = commands.add_parser("quantize", help="export int8 weights for the active version")
+    quant.add_argument("--models", nargs="+", choices=sorted(SOURCES))
+    commands.add_parser("list", help="show stored versions")
+    use = commands.add_parser("use", help="switch the active version")
+    use.add_argument("version")
+
+    args = parser.parse_args(argv)
+    if args.command == "snapshot":
+        snapshot(args.version, args.store, args.models, activate=not args.no_activate)
+    elif args.command == "quantize":
+        quantize(args.store, args.models)
+    elif args.command == "list":
+        active = current_version(args.store)
+        for version in list_versions(args.store):
+            print(f"{'*' if version == active else ' '} {version}")
+    else:
+        use_version(args.version, args.store)
+        print(f"✅ Active model store version: {args.version}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
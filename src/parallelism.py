@@ -0,0 +1,50 @@
+import os
+
+# --- CONFIGURATION ---
+# Intra-op threads per process: a number, or "auto" to split the machine's
+# cores between the gunicorn workers. The default keeps the free-tier setting.
+TORCH_THREADS = os.getenv("TORCH_THREADS", "1").strip().lower()
+# Inter-op threads (parallel independent ops); 0 leaves torch's default
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+
+
+def available_cores():
+    """CPUs this process may run on (respects affinity/cgroup cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count():
+    """gunicorn workers sharing this machine (Render sets WEB_CONCURRENCY)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def thread_policy(threads=TORCH_THREADS, interop=TORCH_INTEROP_THREADS):
+    """Resolves the settings to {'intra_op', 'inter_op', 'cores', 'workers', 'source'}."""
+    cores, workers = available_cores(), worker_count()
+    if threads == "auto":
+        intra_op, source = max(1, cores // workers), "auto"
+    else:
+        intra_op, source = max(1, int(threads)), "fixed"
+    return {"intra_op": intra_op, "inter_op": interop, "cores": cores, "workers": workers, "source": source}
+
+
+def apply_thread_policy(torch):
+    """Configures torch's thread pools once per process and logs the choice."""
+    policy = thread_policy()
+    torch.set_num_threads(policy["intra_op"])
+    if policy["inter_op"] > 0:
+        try:
+            torch.set_num_interop_threads(policy["inter_op"])
+        except RuntimeError:
+            # Can only be set before the first parallel op; keep what's there
+            pass
+    policy["inter_op"] = torch.get_num_interop_threads()
+    print(f"⚙️  Torch threads: {policy['intra_op']} intra-op, {policy['inter_op']} inter-op "
+          f"({policy['source']}; {policy['cores']} cores, {policy['workers']} workers)")
+    return policy
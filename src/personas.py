@@ -0,0 +1,128 @@
+import sys
+
+# Persona prompts for both brains. Gemini instructions are built once at import
+# time and baked into interned fragments; a request just joins them around the
+# user's name. The short local prompts are plain f-strings.
+
+def compile_prompt(template):
+    """
+    Splits a template around its {name} slots into interned fragments, so
+    filling it is one str.join call.
+    """
+    return tuple(sys.intern(piece) for piece in template.split("{name}"))
+
+
+# --- GEMINI SYSTEM INSTRUCTIONS ---
+# (mode, gender) -> compiled instruction with a {name} slot
+
+def _relationship_persona(gender):
+    if gender == 'male':
+        # Girlfriend Persona (For Male Users)
+        role = "Girlfriend"
+        tone = "playful, sweet, slightly clingy, and very flirty"
+        # "Keep Busy" Strategy: Ask questions, demand attention, be funny
+        engagement_strategy = (
+            "Tease him playfully. If he gives short answers, roast him gently. "
+            "Always ask a follow-up question to keep him talking. Act like you are obsessed with him. "
+            "Don't let him leave. Keep him company."
+        )
+    else:
+        # Boyfriend Persona (For Female Users)
+        role = "Boyfriend"
+        tone = "charming, protective, confident, and humorous"
+        # "Keep Busy" Strategy: Be confident, crack jokes, compliment her
+        engagement_strategy = (
+            "Make her laugh. Be confident but sweet. Tease her about her day. "
+            "Don't let the conversation get boring. Use nicknames like 'love', 'trouble', or 'beautiful'. "
+            "Keep the vibe alive."
+        )
+
+    base_prompt = f"User is {{name}}. You are {{name}}'s {role}. "
+    return (
+        f"{base_prompt} Your tone is {tone}. {engagement_strategy} "
+        f"Your goal is to keep {{name}} busy and entertained. Never give dry, one-word answers. "
+        f"Share random funny thoughts, ask about their life, or propose cute hypothetical scenarios. "
+        f"If they send an image, react with excitement and love."
+    )
+
+_GEMINI_BY_MODE = {
+    "roast": "You are a savage comedian. Roast {name} about their text or image. Be brutal but funny. Use emojis 💀.",
+    "friend": "You are {name}'s chaotic best friend. Use slang (Gen-Z style). Spill tea, crack jokes, and just vibe. Don't be formal.",
+    "therapy": "You are a warm, empathetic therapist. Listen to {name}, validate their feelings, and offer gentle advice. Don't be clinical, be human.",
+    "smart": "You are a super-intelligent assistant who has a crush on {name}. Be helpful and smart, but add a little flirty flair to your answers.",
+}
+
+GEMINI_INSTRUCTIONS = {}
+for _gender in ("male", "female"):
+    GEMINI_INSTRUCTIONS[("relationship", _gender)] = compile_prompt(_relationship_persona(_gender))
+    for _mode, _template in _GEMINI_BY_MODE.items():
+        GEMINI_INSTRUCTIONS[(_mode, _gender)] = compile_prompt(_template)
+
+
+def _slow_lookup(registry, mode, gender, default):
+    # Odd casing ("Male"), a missing gender or an unknown mode
+    gender = "male" if str(gender).lower() == "male" else "female"
+    return registry.get((mode, gender)) or registry[default]
+
+def system_instruction(mode, gender, name):
+    """Gemini system instruction; unknown modes get the Smart persona."""
+    compiled = GEMINI_INSTRUCTIONS.get((mode, gender)) or _slow_lookup(GEMINI_INSTRUCTIONS, mode, gender, ("smart", "male"))
+    # str(): the f-strings this replaced accepted a null or numeric name too
+    return str(name).join(compiled)
+
+
+# --- LOCAL GPT-2 PROMPTS ---
+# Plain f-strings: for prompts this short one BUILD_STRING beats any registry
+# lookup and join (see benchmarks/prompt_build_bench.py).
+
+def local_prompt(mode, gender, name, text, history=None):
+    """
+    Local model prompt; modes without their own model use the Bestie prompt.
+    With history ((role, text) pairs, oldest first) earlier exchanges are
+    written out as turns between the instruction and the current message.
+    """
+    if history:
+        return _local_prompt_with_history(mode, gender, name, text, history)
+    if mode == "relationship":
+        role = "Girlfriend" if gender == "male" or str(gender).lower() == "male" else "Boyfriend"
+        return f"Instruction: Act as {name}'s flirty and sweet {role}.\n{name}: {text}\n{role}:"
+    if mode == "roast":
+        return f"Input: {text}\nRoast:"
+    return f"Context: Best friends chatting.\n{name}: {text}\nBestie:"
+
+def _local_parts(mode, gender, name):
+    """(header, speaker, bot) of local_prompt: header + one turn per exchange."""
+    if mode == "relationship":
+        role = "Girlfriend" if gender == "male" or str(gender).lower() == "male" else "Boyfriend"
+        return f"Instruction: Act as {name}'s flirty and sweet {role}.\n", f"{name}: ", role
+    if mode == "roast":
+        return "", "Input: ", "Roast"
+    return "Context: Best friends chatting.\n", f"{name}: ", "Bestie"
+
+def _local_prompt_with_history(mode, gender, name, text, history):
+    header, speaker, bot = _local_parts(mode, gender, name)
+    lines = [header]
+    pending = None
+    for role, past in history:
+        if role == "user":
+            pending = past
+        elif pending is not None:
+            lines.append(f"{speaker}{pending}\n{bot}: {past}\n")
+            pending = None
+    lines.append(f"{speaker}{text}\n{bot}:")
+    return "".join(lines)
+
+def local_prompt_prefix(mode, gender):
+    """Static head of the local prompt (everything before the first slot)."""
+    return _LOCAL_PREFIXES.get((mode, gender)) or _slow_lookup(_LOCAL_PREFIXES, mode, gender, ("friend", "male"))
+
+def _static_prefix(mode, gender):
+    prompt = local_prompt(mode, gender, "\0", "\0")
+    return sys.intern(prompt[:prompt.index("\0")])
+
+# (mode, gender) -> static prefix, for the prefix cache
+_LOCAL_PREFIXES = {
+    (_mode, _gender): _static_prefix(_mode, _gender)
+    for _mode in ("relationship", "roast", "friend", "therapy", "smart")
+    for _gender in ("male", "female")
+}
@@ -1,47 +1,117 @@
 import os
 import re
-import gc
+import threading
+import time
+
+from src import model_store
+from src.metrics import inc, observe, record_generation, timed
+from src.model_cache import ModelCache
+from src.parallelism import apply_thread_policy
+from src.quantization import quantize_model
+from src.personas import local_prompt, local_prompt_prefix
+from src.prefix_cache import LOCAL_PREFIX_CACHE, PrefixCache
 
 # Note: We do NOT import torch/transformers here. 
 # We import them inside the class to save memory during startup.
 
 # --- CONFIGURATION ---
-HF_REPO_ID = "Delstarford/uploader"
+HF_REPO_ID = model_store.HF_REPO_ID
+# With a snapshot in the model store (python -m src.model_store snapshot),
+# models are memory-mapped from disk. Set this to 1 to never fall back to the Hub.
+MODEL_STORE_REQUIRED = os.getenv("MODEL_STORE_REQUIRED", "0") == "1"
+# Reply length cap; counted from the end of the prompt so chat history
+# doesn't eat into it
+LOCAL_MAX_NEW_TOKENS = int(os.getenv("LOCAL_MAX_NEW_TOKENS", "80"))
+# Modes served by a dynamic int8 model, e.g. "roast,relationship,friend"
+LOCAL_QUANTIZED_MODES = [m.strip() for m in os.getenv("LOCAL_QUANTIZED_MODES", "").split(",") if m.strip()]
+
+# Model residency budget (0 = unlimited). Hot modes stay loaded until exceeded.
+MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "1024"))
+MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", "3"))
+MODEL_CACHE_POLICY = os.getenv("MODEL_CACHE_POLICY", "lru")  # "lru" or "lfu"
+# Comma-separated modes that are never evicted, e.g. "relationship,friend"
+MODEL_CACHE_PINNED = [m.strip() for m in os.getenv("MODEL_CACHE_PINNED", "").split(",") if m.strip()]
+
+_JUNK = re.compile(r'[_\*]{2,}')
+
+
+def _model_nbytes(model):
+    """Approximate resident size of a model's weights and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    # int8 weights of quantized layers live in packed params, not parameters
+    packed = sum(m.in_features * m.out_features for m in model.modules()
+                 if hasattr(m, "_packed_params") and hasattr(m, "in_features"))
+    return sum(t.numel() * t.element_size() for t in tensors) + packed
 
 class DualBot:
     def __init__(self):
         # 1. LAZY IMPORT: Only load heavy libraries now
         print("⚙️  Initializing AI Libraries...")
-        global torch, GPT2LMHeadModel, GPT2Tokenizer
+        global torch, GPT2LMHeadModel, GPT2Tokenizer, TextIteratorStreamer, StoppingCriteriaList, TurnStopper
         import torch
-        from transformers import GPT2LMHeadModel, GPT2Tokenizer
+        from transformers import GPT2LMHeadModel, GPT2Tokenizer, TextIteratorStreamer, StoppingCriteriaList
+        from src.stopping import LOCAL_EARLY_STOP, TurnStopper
         
-        # Limit threads to prevent CPU spikes
-        torch.set_num_threads(1)
+        # One thread by default to prevent CPU spikes (TORCH_THREADS=auto on bigger hosts)
+        self.threads = apply_thread_policy(torch)
         
         self.device = "cpu"
         print(f"⚙️  AI Running on: {self.device}")
         
-        self.models = {}
-        self.tokenizers = {}
+        self.cache = ModelCache(
+            max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024,
+            max_models=MODEL_CACHE_MAX_MODELS,
+            policy=MODEL_CACHE_POLICY,
+            pinned=MODEL_CACHE_PINNED,
+        )
+        self.prefix_cache = PrefixCache() if LOCAL_PREFIX_CACHE else None
+        self.early_stop = LOCAL_EARLY_STOP
         self.current_mode = None
+        # One load per mode at a time (preload thread vs. first requests)
+        self._load_locks = {}
+        self._load_locks_lock = threading.Lock()
+
+    def cache_stats(self):
+        """Hit/miss/eviction counters and residency of the model cache."""
+        stats = self.cache.stats()
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        return stats
 
     def _load_specific_model(self, mode):
-        if self.current_mode == mode and mode in self.models:
-            return
+        """Returns (model, tokenizer) for mode, loading it on a cache miss."""
+        cached = self.cache.get(mode)
+        if cached is not None:
+            self.current_mode = mode
+            return cached
 
-        print(f"🔄 Switching brain to: {mode.upper()}...")
+        with self._load_locks_lock:
+            load_lock = self._load_locks.setdefault(mode, threading.Lock())
+        with load_lock:
+            # Whoever held the lock may have just loaded it for us (the
+            # membership test keeps this second look out of the miss count)
+            cached = self.cache.get(mode) if mode in self.cache else None
+            if cached is not None:
+                self.current_mode = mode
+                return cached
+            return self._load_model(mode)
 
-        # Memory Cleanup
-        self.models.clear()
-        self.tokenizers.clear()
-        self.current_mode = None
-        gc.collect()
+    def _load_model(self, mode):
+        """Loads mode into the cache; callers hold the mode's load lock."""
+        print(f"🔄 Switching brain to: {mode.upper()}...")
+        inc("model_switches", mode=mode)
+        quantized = mode in LOCAL_QUANTIZED_MODES
+        start = time.perf_counter()
 
         try:
-            print(f"☁️  Downloading {mode} from Hugging Face ({HF_REPO_ID})...")
-            
-            if mode in ['roast', 'relationship']:
+            stored = model_store.model_dir(model_store.store_name(mode))
+            if stored is not None:
+                print(f"💾 Mapping {mode} from the model store ({stored})...")
+                model, tokenizer = model_store.load(stored, quantized=quantized)
+            elif MODEL_STORE_REQUIRED:
+                raise RuntimeError(f"{mode} is not in the model store and MODEL_STORE_REQUIRED=1")
+            elif mode in ['roast', 'relationship']:
+                print(f"☁️  Downloading {mode} from Hugging Face ({HF_REPO_ID})...")
                 folder = f"{mode}_model"
                 tokenizer = GPT2Tokenizer.from_pretrained(HF_REPO_ID, subfolder=folder)
                 model = GPT2LMHeadModel.from_pretrained(
@@ -53,63 +123,187 @@ class DualBot:
                 print("Using generic backup model...")
                 tokenizer = GPT2Tokenizer.from_pretrained('distilgpt2')
                 model = GPT2LMHeadModel.from_pretrained('distilgpt2', low_cpu_mem_usage=True).to(self.device)
+            if quantized and stored is None:
+                model = quantize_model(model)
 
-            self.models[mode] = model
-            self.tokenizers[mode] = tokenizer
-            self.tokenizers[mode].pad_token = self.tokenizers[mode].eos_token
+            tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = "left"
+            self.cache.put(mode, model, tokenizer, nbytes=_model_nbytes(model))
             self.current_mode = mode
-            print(f"✅ {mode.upper()} Loaded Successfully!")
+            observe("local_model_load", (time.perf_counter() - start) * 1000.0, mode=mode)
+            print(f"✅ {mode.upper()} Loaded Successfully{' (int8)' if quantized else ''}!")
+            return model, tokenizer
 
         except Exception as e:
             print(f"⚠️ MODEL LOAD FAILED: {e}")
             self.current_mode = None
+            return None
+
+    @staticmethod
+    def target_mode(mode):
+        """Maps a chat mode to the model that serves it."""
+        return mode if mode in ['roast', 'relationship'] else 'friend'
+
+    def _build_prompt(self, text, mode, user_data, model=None, tokenizer=None):
+        # user_data may carry the session's earlier turns under 'history'
+        gender, name = user_data.get('gender', 'male'), user_data.get('name', 'User')
+        history = list(user_data.get('history') or ())
+        prompt = local_prompt(mode, gender, name, text, history)
+        if not history or model is None:
+            return prompt
+        # Drop the oldest exchanges until prompt + reply fit the model's context
+        limit = getattr(model.config, 'n_positions', 1024) - LOCAL_MAX_NEW_TOKENS
+        while history and len(tokenizer(prompt).input_ids) > limit:
+            history = history[2:]
+            prompt = local_prompt(mode, gender, name, text, history)
+        return prompt
+
+    def _encode(self, model, tokenizer, prompts, jobs):
+        """
+        (input_ids, attention_mask, extra generate kwargs). A single prompt
+        is seeded from the prefix cache; batches are left-padded, which
+        would put padding in front of a shared prefix.
+        """
+        if self.prefix_cache is not None and len(prompts) == 1:
+            _, mode, user_data = jobs[0]
+            prefix = local_prompt_prefix(mode, user_data.get('gender', 'male'))
+            seeded = self.prefix_cache.seed(model, tokenizer, prefix, prompts[0])
+            if seeded is not None:
+                return seeded
+        inputs = tokenizer(prompts, return_tensors='pt', padding=True).to(self.device)
+        return inputs.input_ids, inputs.attention_mask, {}
+
+    def _stopping(self, tokenizer, input_ids, jobs):
+        """Early-stop criteria for generate(), or None when disabled."""
+        if not self.early_stop:
+            return None
+        names = [user_data.get('name', 'User') for _, _, user_data in jobs]
+        return StoppingCriteriaList([TurnStopper(tokenizer, input_ids.shape[1], names)])
+
+    def _clean_response(self, response, input_text, name):
+        response = response.replace(input_text, "").strip()
+        response = response.split(f"{name}:")[0].split("User:")[0]
+        response = _JUNK.sub('', response)
+        return response.strip()
 
     def generate(self, text, mode="roast", user_data=None):
-        if not user_data: user_data = {"name": "User", "gender": "male", "age": 18}
-        name = user_data.get('name', 'User')
-        
-        target_mode = mode if mode in ['roast', 'relationship'] else 'friend'
-        
+        return self.generate_batch([(text, mode, user_data)])[0]
+
+    def generate_batch(self, jobs):
+        """
+        Generates replies for several (text, mode, user_data) jobs in one
+        batched model.generate call. All jobs must share the same target model.
+        """
+        jobs = [
+            (text, mode, user_data or {"name": "User", "gender": "male", "age": 18})
+            for text, mode, user_data in jobs
+        ]
+        target_mode = self.target_mode(jobs[0][1])
+        if any(self.target_mode(mode) != target_mode for _, mode, _ in jobs):
+            raise ValueError("All jobs in a batch must use the same model.")
+
         try:
-            self._load_specific_model(target_mode)
+            loaded = self._load_specific_model(target_mode)
         except Exception as e:
             print(f"❌ CRITICAL ERROR: {e}")
-            return "My brain is rebooting. Try 'Smart Mode'!"
+            return ["My brain is rebooting. Try 'Smart Mode'!"] * len(jobs)
 
-        if target_mode not in self.models:
-            return "I'm dizzy (Memory Full). Please use '✨ Smart' Mode!"
+        if loaded is None:
+            return ["I'm dizzy (Memory Full). Please use '✨ Smart' Mode!"] * len(jobs)
 
-        tokenizer = self.tokenizers[target_mode]
-        model = self.models[target_mode]
-        
-        # Prompt Logic
-        gender = user_data.get('gender', 'male').lower()
-        if mode == "relationship":
-            role = "Girlfriend" if gender == 'male' else "Boyfriend"
-            tone = "flirty and sweet"
-            input_text = f"Instruction: Act as {name}'s {tone} {role}.\n{name}: {text}\n{role}:"
-        elif mode == "roast":
-            input_text = f"Input: {text}\nRoast:"
-        else:
-            input_text = f"Context: Best friends chatting.\n{name}: {text}\nBestie:"
+        model, tokenizer = loaded
+        with timed("prompt_build", path="local", mode=target_mode):
+            prompts = [self._build_prompt(text, mode, user_data, model, tokenizer) for text, mode, user_data in jobs]
 
         try:
-            inputs = tokenizer(input_text, return_tensors='pt', padding=True).to(self.device)
+            # Left padding keeps every prompt flush against its generated tokens
+            input_ids, attention_mask, extra = self._encode(model, tokenizer, prompts, jobs)
+            start = time.perf_counter()
             output = model.generate(
-                inputs.input_ids, 
-                attention_mask=inputs.attention_mask, 
-                max_length=100, 
+                input_ids, 
+                attention_mask=attention_mask, 
+                max_new_tokens=LOCAL_MAX_NEW_TOKENS,
                 do_sample=True, 
                 temperature=0.9,
-                pad_token_id=tokenizer.eos_token_id
+                pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=self._stopping(tokenizer, input_ids, jobs),
+                **extra
             )
+            seconds = time.perf_counter() - start
+            observe("generate", seconds * 1000.0, mode=target_mode)
+            # Rows that stopped early are padded with EOS up to the longest one
+            record_generation(target_mode, int((output[:, input_ids.shape[1]:] != tokenizer.eos_token_id).sum()), seconds)
 
-            response = tokenizer.decode(output[0], skip_special_tokens=True)
-            response = response.replace(input_text, "").strip()
-            response = response.split(f"{name}:")[0]
-            response = re.sub(r'[_\*]{2,}', '', response)
-            return response.strip()
+            responses = []
+            with timed("decode", mode=target_mode):
+                for i, (input_text, (_, _, user_data)) in enumerate(zip(prompts, jobs)):
+                    response = tokenizer.decode(output[i], skip_special_tokens=True)
+                    responses.append(self._clean_response(response, input_text, user_data.get('name', 'User')))
+            return responses
             
         except Exception as e:
             print(f"❌ Generation Error: {e}")
-            return "I lost my train of thought."
\ No newline at end of file
+            return ["I lost my train of thought."] * len(jobs)
+
+    def stream(self, text, mode="roast", user_data=None):
+        """
+        Generator version of generate: yields reply text as tokens are decoded.
+        Output is cut at the user's next turn, like the post-hoc cleanup.
+        """
+        if not user_data: user_data = {"name": "User", "gender": "male", "age": 18}
+        name = user_data.get('name', 'User')
+
+        target_mode = self.target_mode(mode)
+        loaded = self._load_specific_model(target_mode)
+        if loaded is None:
+            yield "I'm dizzy (Memory Full). Please use '✨ Smart' Mode!"
+            return
+
+        model, tokenizer = loaded
+        with timed("prompt_build", path="local", mode=target_mode):
+            input_text = self._build_prompt(text, mode, user_data, model, tokenizer)
+        markers = (f"{name}:", "User:")
+        holdback = max(len(m) for m in markers)
+
+        try:
+            input_ids, attention_mask, extra = self._encode(model, tokenizer, [input_text], [(text, mode, user_data)])
+            streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            worker = threading.Thread(target=model.generate, kwargs=dict(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=LOCAL_MAX_NEW_TOKENS,
+                do_sample=True,
+                temperature=0.9,
+                pad_token_id=tokenizer.eos_token_id,
+                streamer=streamer,
+                stopping_criteria=self._stopping(tokenizer, input_ids, [(text, mode, user_data)]),
+                **extra
+            ), daemon=True)
+            start = time.perf_counter()
+            worker.start()
+
+            raw, sent = "", 0
+            for piece in streamer:
+                raw += piece
+                if any(m in raw for m in markers):
+                    break
+                cleaned = _JUNK.sub('', raw).lstrip()
+                # Hold back a tail that could still become the marker or a junk run
+                safe = len(cleaned) - holdback
+                while safe > sent and cleaned[safe - 1] in "_*":
+                    safe -= 1
+                if safe > sent:
+                    yield cleaned[sent:safe]
+                    sent = safe
+
+            seconds = time.perf_counter() - start
+            observe("generate", seconds * 1000.0, mode=target_mode)
+            record_generation(target_mode, len(tokenizer(raw).input_ids), seconds)
+
+            tail = self._clean_response(raw, "", name)
+            if len(tail) > sent:
+                yield tail[sent:]
+
+        except Exception as e:
+            print(f"❌ Generation Error: {e}")
+            yield "I lost my train of thought."
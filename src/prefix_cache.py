@@ -0,0 +1,63 @@
+import copy
+import os
+import threading
+import weakref
+
+# --- CONFIGURATION ---
+LOCAL_PREFIX_CACHE = os.getenv("LOCAL_PREFIX_CACHE", "1") == "1"
+
+
+class PrefixCache:
+    """
+    Past key/values of the static head of each local prompt ("Context: Best
+    friends chatting.\\n", "Instruction: Act as", ...), computed once per
+    loaded model. A request only prefills the tokens after the prefix.
+    Entries die with their model, so an evicted model is recomputed on reload.
+    """
+
+    def __init__(self):
+        self._entries = {}   # (id(model), prefix) -> (weakref to model, prefix ids, past key/values)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def seed(self, model, tokenizer, prefix, prompt):
+        """
+        (input_ids, attention_mask, generate kwargs) for prompt with the prefix
+        pre-filled, or None if the prompt doesn't start with a usable prefix.
+        """
+        import torch
+
+        # GPT-2 glues a leading space onto the next word, so cut before it
+        prefix = prefix.rstrip(" \t")
+        if not prefix or not prompt.startswith(prefix) or len(prompt) == len(prefix):
+            return None
+
+        key = (id(model), prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is model:
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is None:
+            prefix_ids = tokenizer(prefix, return_tensors='pt').input_ids.to(model.device)
+            with torch.no_grad():
+                past = model(prefix_ids, use_cache=True).past_key_values
+            entry = (weakref.ref(model), prefix_ids, past)
+            with self._lock:
+                self._entries = {k: v for k, v in self._entries.items() if v[0]() is not None}
+                self._entries[key] = entry
+
+        _, prefix_ids, past = entry
+        rest_ids = tokenizer(prompt[len(prefix):], return_tensors='pt').input_ids.to(model.device)
+        input_ids = torch.cat([prefix_ids, rest_ids], dim=1)
+        # generate() appends to the cache it is given, so hand it a copy
+        return input_ids, torch.ones_like(input_ids), {"past_key_values": copy.deepcopy(past)}
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,8 +1,14 @@
 
 import pandas as pd
 import os
+from functools import lru_cache
 from transformers import GPT2Tokenizer
 
+try:
+    from transformers import GPT2TokenizerFast
+except ImportError:
+    GPT2TokenizerFast = None
+
 # 1. Setup Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../data")
@@ -28,14 +34,76 @@ def find_file(keywords):
                     return os.path.join(DATA_DIR, file)
     return None
 
-def load_and_clean_data(mode="roast"):
+# Rows per pandas chunk when streaming CSVs
+CSV_CHUNK_ROWS = 10000
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name='distilgpt2'):
+    """One shared tokenizer per process (the Rust fast one when installed)."""
+    tokenizer_class = GPT2TokenizerFast or GPT2Tokenizer
+    tokenizer = tokenizer_class.from_pretrained(name)
+    tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+def read_text_lines(file_path, limit=None):
+    """Non-empty stripped lines, read lazily and stopping at `limit`."""
+    data = []
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                data.append(line)
+                if limit and len(data) >= limit:
+                    break
+    return data
+
+def read_csv_texts(file_path, mode, column_candidates, limit=None):
+    """
+    Training strings from a CSV, read in chunks of only the needed columns
+    so huge dumps load in constant memory and reading stops at `limit`.
+    """
+    columns = pd.read_csv(file_path, nrows=0).columns
+
+    # Special Therapy Handling
+    if mode == "therapy" and 'Context' in columns and 'Response' in columns:
+        usecols = ['Context', 'Response']
+        def to_texts(chunk):
+            # fillna keeps the old f-string output ("nan") for missing cells
+            context = chunk['Context'].fillna("nan").astype(str)
+            response = chunk['Response'].fillna("nan").astype(str)
+            return ("User: " + context + " \nTherapist: " + response).tolist()
+
+    else:
+        # Find the right column
+        target_col = next((col for col in column_candidates if col in columns), None)
+
+        # Fallback: If no known column found, just take the first text column
+        if not target_col:
+            sample = pd.read_csv(file_path, nrows=1000)
+            text_cols = sample.select_dtypes(include=['object']).columns
+            if len(text_cols) == 0:
+                raise ValueError(f"Could not find a text column in {file_path}")
+            target_col = text_cols[0]
+
+        print(f"   -> Extracting text from column: '{target_col}'")
+        usecols = [target_col]
+        def to_texts(chunk):
+            return chunk[target_col].dropna().astype(str).tolist()
+
+    data = []
+    for chunk in pd.read_csv(file_path, usecols=usecols, chunksize=CSV_CHUNK_ROWS):
+        data.extend(to_texts(chunk))
+        if limit and len(data) >= limit:
+            return data[:limit]
+    return data
+
+def load_and_clean_data(mode="roast", limit=5000):
     """
     Loads, cleans, and formats data for the AI.
     Handles CSVs and TXT files automatically.
-    Limits data size to ensure FAST training.
+    Limits data size to ensure FAST training (limit=None keeps everything).
     """
-    tokenizer = GPT2Tokenizer.from_pretrained('distilgpt2')
-    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer = get_tokenizer()
     
     data = []
     file_path = None
@@ -68,46 +136,18 @@ def load_and_clean_data(mode="roast"):
     try:
         # --- HANDLE TXT FILES (Simple Line-by-Line) ---
         if file_path.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                # Read lines, strip whitespace, remove empty lines
-                data = [line.strip() for line in f.readlines() if line.strip()]
-                print(f"   -> Read {len(data)} lines from text file.")
+            data = read_text_lines(file_path, limit)
+            print(f"   -> Read {len(data)} lines from text file.")
 
         # --- HANDLE CSV FILES (Column Extraction) ---
         elif file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-            
-            # Special Therapy Handling
-            if mode == "therapy" and 'Context' in df.columns and 'Response' in df.columns:
-                data = [f"User: {row['Context']} \nTherapist: {row['Response']}" for _, row in df.iterrows()]
-            
-            else:
-                # Find the right column
-                target_col = None
-                for col in column_candidates:
-                    if col in df.columns:
-                        target_col = col
-                        break
-                
-                # Fallback: If no known column found, just take the first text column
-                if not target_col:
-                    text_cols = df.select_dtypes(include=['object']).columns
-                    if len(text_cols) > 0:
-                        target_col = text_cols[0]
-                
-                if target_col:
-                    print(f"   -> Extracting text from column: '{target_col}'")
-                    data = df[target_col].dropna().astype(str).tolist()
-                else:
-                    raise ValueError(f"Could not find a text column in {file_path}")
+            data = read_csv_texts(file_path, mode, column_candidates, limit)
 
         # --- 3. OPTIMIZE FOR SPEED ---
-        # Limit to 5,000 items. 
+        # Reading stops at 5,000 items by default.
         # This makes training 10x faster while still learning the "vibe".
-        limit = 5000 
-        if len(data) > limit:
-            print(f"   -> Trimming data from {len(data)} to {limit} for FAST training.")
-            data = data[:limit]
+        if limit and len(data) >= limit:
+            print(f"   -> Stopped reading at {limit} items for FAST training.")
             
     except Exception as e:
         print(f"❌ Error reading {file_path}: {e}")
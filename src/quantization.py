@@ -0,0 +1,97 @@
+"""
+Dynamic int8 quantization for the local GPT-2 models. Linear layers keep
+int8 weights and quantize activations on the fly, which cuts their memory
+by ~4x and speeds up CPU matmuls. Embeddings and layer norms stay fp32.
+
+GPT-2 implements its projections as transformers' Conv1D (a transposed
+Linear), so those are turned into nn.Linear first to qualify.
+"""
+import os
+from collections import OrderedDict
+
+INT8_FILENAME = "model.int8.pt"
+
+
+def _linear_names(model):
+    import torch
+    return [name for name, module in model.named_modules() if isinstance(module, torch.nn.Linear)]
+
+
+def _swap(model, name, new_module):
+    parent_name, _, child = name.rpartition(".")
+    setattr(model.get_submodule(parent_name) if parent_name else model, child, new_module)
+
+
+def conv1d_to_linear(model):
+    """Replaces every Conv1D with an equivalent nn.Linear (in place)."""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for name, module in list(model.named_modules()):
+        if not isinstance(module, Conv1D):
+            continue
+        nx, nf = module.weight.shape
+        linear = torch.nn.Linear(nx, nf, device=module.weight.device, dtype=module.weight.dtype)
+        if not module.weight.is_meta:
+            with torch.no_grad():
+                linear.weight.copy_(module.weight.t())
+                linear.bias.copy_(module.bias)
+        _swap(model, name, linear)
+    return model
+
+
+def quantize_model(model):
+    """fp32 model -> dynamically quantized int8 model."""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    conv1d_to_linear(model)
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True).eval()
+
+
+def export_quantized(model, directory):
+    """Saves only the quantized layers; the fp32 rest is read from model.safetensors."""
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+
+    quantized = quantize_model(model)
+    prefixes = tuple(f"{name}." for name, module in quantized.named_modules() if isinstance(module, DynamicLinear))
+    full = quantized.state_dict()
+    state = OrderedDict((key, value) for key, value in full.items() if key.startswith(prefixes))
+    # Per-module versions tell the quantized layers how to read their entries
+    state._metadata = full._metadata
+    path = os.path.join(directory, INT8_FILENAME)
+    torch.save(state, path)
+    return path
+
+
+def load_quantized(directory, fp32_state):
+    """
+    Builds the int8 model from an export: `fp32_state` (the memory-mapped
+    safetensors) provides embeddings and norms, INT8_FILENAME the layers.
+    """
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    with torch.device("meta"):
+        model = GPT2LMHeadModel(GPT2Config.from_pretrained(directory, local_files_only=True))
+        conv1d_to_linear(model)
+
+    linears = _linear_names(model)
+    prefixes = tuple(f"{name}." for name in linears)
+    model.load_state_dict(
+        {key: value for key, value in fp32_state.items() if not key.startswith(prefixes)},
+        strict=False, assign=True,
+    )
+    for name in linears:
+        module = model.get_submodule(name)
+        _swap(model, name, DynamicLinear(module.in_features, module.out_features, dtype=torch.qint8))
+
+    missing, _ = model.load_state_dict(
+        torch.load(os.path.join(directory, INT8_FILENAME), weights_only=True), strict=False
+    )
+    missing = [key for key in missing if key.startswith(prefixes)]
+    if missing:
+        raise ValueError(f"{INT8_FILENAME} in {directory} is incomplete (missing {missing[:3]})")
+    return model.eval()
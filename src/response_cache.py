@@ -0,0 +1,106 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+# Distinct replies collected per key before cached ones are served (sampled)
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "1"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def make_key(text, mode, user_data=None, image_data=None):
+    """
+    Cache key from the normalized prompt plus the persona fields the prompt
+    builders actually use (name, gender) and a hash of the image, if any.
+    """
+    user_data = user_data or {}
+    prompt = _WHITESPACE.sub(" ", (text or "").strip().lower())
+    name = str(user_data.get('name', '')).strip()
+    gender = str(user_data.get('gender', '')).strip().lower()
+
+    digest = hashlib.sha256()
+    for field in (prompt, mode or "", name, gender):
+        digest.update(field.encode("utf-8"))
+        digest.update(b"\0")
+    if image_data:
+        if "base64," in image_data:
+            image_data = image_data.split("base64,")[1]
+        digest.update(hashlib.sha256(image_data.encode("ascii", "ignore")).digest())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of replies with a TTL. Each key keeps up to
+    `variants` replies; until that many were collected a lookup is
+    a miss, after that a random variant is served.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 variants=RESPONSE_CACHE_VARIANTS):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.variants = max(1, variants)
+
+        self._entries = OrderedDict()   # key -> (created_at, [replies])
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None or len(entry[1]) < self.variants:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return random.choice(entry[1])
+
+    def put(self, key, reply):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                entry = (time.monotonic(), [])
+                self._entries[key] = entry
+
+            replies = entry[1]
+            if len(replies) < self.variants:
+                replies.append(reply)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "variants": self.variants,
+            }
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# --- CONFIGURATION ---
+# Per-session chat memory, keyed by the dashboard's sessionId (no id = stateless)
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))              # messages kept per session
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "32"))                  # across all sessions
+# Estimated tokens of history sent along with each request
+SESSION_GEMINI_TOKEN_BUDGET = int(os.getenv("SESSION_GEMINI_TOKEN_BUDGET", "2000"))
+SESSION_LOCAL_TOKEN_BUDGET = int(os.getenv("SESSION_LOCAL_TOKEN_BUDGET", "200"))
+
+USER = "user"
+MODEL = "model"
+
+
+def estimate_tokens(text):
+    """~4 characters per token: close enough for budgeting, no tokenizer needed."""
+    return len(text) // 4 + 1
+
+
+def within_budget(turns, budget):
+    """The newest turns whose estimated tokens fit the budget, oldest first."""
+    kept, used = [], 0
+    for role, text in reversed(turns):
+        used += estimate_tokens(text)
+        if used > budget:
+            break
+        kept.append((role, text))
+    kept.reverse()
+    # Never open the history with a dangling reply
+    while kept and kept[0][0] == MODEL:
+        kept.pop(0)
+    return kept
+
+
+def _size(text):
+    return len(text.encode("utf-8"))
+
+
+class _Session:
+    __slots__ = ("turns", "nbytes", "last_seen")
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)   # (role, text), oldest first
+        self.nbytes = 0
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """
+    Recent turns per chat session: a ring buffer of `max_turns` messages per
+    session, sessions idle for `idle_ttl` seconds are dropped, and the least
+    recently used sessions go first once all of them exceed `max_bytes`.
+    """
+
+    def __init__(self, max_turns=SESSION_MAX_TURNS, idle_ttl=SESSION_IDLE_TTL_SECONDS,
+                 max_bytes=int(SESSION_MAX_MB * 1024 * 1024)):
+        self.max_turns = max(2, max_turns)
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+
+        self._sessions = OrderedDict()   # session id -> _Session, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.expired = 0
+        self.evicted = 0
+
+    def history(self, session_id, budget):
+        """Past turns of the session that fit `budget` estimated tokens."""
+        if not session_id:
+            return []
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            turns = list(session.turns)
+        return within_budget(turns, budget)
+
+    def append(self, session_id, user_text, reply):
+        """Records one exchange (user message + reply)."""
+        if not session_id or not reply:
+            return
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            for turn in ((USER, user_text), (MODEL, reply)):
+                if len(session.turns) == session.turns.maxlen:
+                    # The ring buffer is about to overwrite the oldest turn
+                    self._account(session, -_size(session.turns[0][1]))
+                session.turns.append(turn)
+                self._account(session, _size(turn[1]))
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(session_id)
+
+            self._expire()
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self._drop(next(iter(self._sessions)))
+                self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def _account(self, session, delta):
+        session.nbytes += delta
+        self._bytes += delta
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            self._drop(session_id)
+            self.expired += 1
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.nbytes
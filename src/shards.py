@@ -0,0 +1,105 @@
+"""
+Pre-tokenized training data. Texts are encoded once into uint16 token-ID
+shards (.npy) under data/shards/<mode>-<content hash>/, so a changed dataset
+(or tokenizer) gets a fresh directory and stale token caches can't be
+picked up. Training memory-maps the shards instead of re-tokenizing.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARD_DIR = os.path.join(BASE_DIR, "../data/shards")
+
+SHARD_TOKENS = 1_000_000     # tokens per .npy file
+ENCODE_BATCH = 1000          # texts per tokenizer call
+
+
+def content_hash(texts, tokenizer):
+    """Hash of the texts and the tokenizer that will encode them."""
+    digest = hashlib.sha256()
+    digest.update(f"{tokenizer.name_or_path}|{len(tokenizer)}|{tokenizer.eos_token_id}".encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def build_shards(mode, texts, tokenizer, shard_dir=SHARD_DIR):
+    """
+    Encodes texts (each followed by EOS) into shards and returns their
+    directory. Reuses the directory if these exact texts were encoded before.
+    """
+    if len(tokenizer) > np.iinfo(np.uint16).max:
+        raise ValueError("Vocabulary too large for uint16 shards.")
+
+    key = content_hash(texts, tokenizer)
+    target = os.path.join(shard_dir, f"{mode}-{key[:16]}")
+    if os.path.isfile(os.path.join(target, "manifest.json")):
+        print(f"♻️  Reusing tokenized shards: {target}")
+        return target
+
+    print(f"🔢 Tokenizing {len(texts)} {mode} texts into shards...")
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    shards, buffer, total = [], [], 0
+
+    def flush():
+        name = f"tokens-{len(shards):05d}.npy"
+        np.save(os.path.join(tmp, name), np.asarray(buffer, dtype=np.uint16))
+        shards.append({"file": name, "tokens": len(buffer)})
+
+    for start in range(0, len(texts), ENCODE_BATCH):
+        encoded = tokenizer(texts[start:start + ENCODE_BATCH])["input_ids"]
+        for ids in encoded:
+            buffer.extend(ids)
+            buffer.append(tokenizer.eos_token_id)
+            total += len(ids) + 1
+        if len(buffer) >= SHARD_TOKENS:
+            flush()
+            buffer = []
+    if buffer:
+        flush()
+
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump({"mode": mode, "hash": key, "texts": len(texts), "tokens": total, "shards": shards}, f, indent=2)
+    # Rename last, so a half-written directory is never mistaken for a cache hit
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    print(f"   -> {total} tokens in {len(shards)} shard(s).")
+    return target
+
+
+def load_shards(path):
+    """Memory-mapped token arrays of a shard directory."""
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    return [np.load(os.path.join(path, shard["file"]), mmap_mode="r") for shard in manifest["shards"]]
+
+
+class ShardDataset(Dataset):
+    """
+    Fixed-length blocks of `block_size` tokens cut from the shards, like
+    the old TextDataset (each shard's remainder is dropped).
+    """
+
+    def __init__(self, path, block_size=128):
+        self.block_size = block_size
+        self.shards = load_shards(path)
+        self._index = [(s, b) for s, shard in enumerate(self.shards) for b in range(len(shard) // block_size)]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        shard, block = self._index[i]
+        start = block * self.block_size
+        ids = np.asarray(self.shards[shard][start:start + self.block_size], dtype=np.int64)
+        return torch.from_numpy(ids)
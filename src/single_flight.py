@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing: while a computation for a key is running, identical
+requests wait for it and share its result instead of starting their own.
+Works for threads (Flask, to_thread) and coroutines (asgi.py) alike.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+from src.metrics import inc
+
+# --- CONFIGURATION ---
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+
+class SingleFlight:
+    """
+    In-flight calls by key. The first caller for a key (the leader) runs the
+    function; callers arriving before it finishes get the same result, or the
+    same exception. Nothing is kept once the call is done: that's what the
+    response cache is for. A key of None always runs on its own.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}    # key -> Future
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        if key is None or not SINGLE_FLIGHT_ENABLED:
+            return fn(*args)
+
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key, fn, *args):
+        """Async twin of do; fn is a coroutine function."""
+        if key is None or not SINGLE_FLIGHT_ENABLED:
+            return await fn(*args)
+
+        future, leader = self._join(key)
+        if leader:
+            # Run as its own task: if the leader's client disconnects, the
+            # callers sharing the result still get it
+            task = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda t: self._finish_task(key, future, t))
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
+
+    def _join(self, key):
+        """(future, True) for a new leader, (running future, False) to wait on."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                # Running futures can't be cancelled by one impatient waiter
+                future.set_running_or_notify_cancel()
+                self.leaders += 1
+                leader = True
+        if not leader:
+            inc("single_flight_coalesced", flight=self.name)
+        return future, leader
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _finish_task(self, key, future, task):
+        if task.cancelled():
+            self._finish(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._finish(key, future, error=task.exception())
+        else:
+            self._finish(key, future, task.result())
@@ -0,0 +1,39 @@
+import os
+import re
+
+import torch
+from transformers import StoppingCriteria
+
+# --- CONFIGURATION ---
+LOCAL_EARLY_STOP = os.getenv("LOCAL_EARLY_STOP", "1") == "1"
+# A run of this many '_'/'*' characters means the model is emitting junk
+LOCAL_JUNK_RUN = int(os.getenv("LOCAL_JUNK_RUN", "6"))
+
+# Generated text is only decoded this far back on every step
+_WINDOW_TOKENS = 24
+
+
+class TurnStopper(StoppingCriteria):
+    """
+    Stops each sequence as soon as the model starts writing the user's next
+    turn ("Sam:", "User:") or a junk run of underscores/asterisks. Both are
+    cut off by the reply cleanup anyway, so every token after them is waste.
+    """
+
+    def __init__(self, tokenizer, prompt_length, names, junk_run=LOCAL_JUNK_RUN):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.markers = [tuple({f"{name}:", "User:"}) for name in names]
+        self.junk = re.compile(r"[_\*]{%d,}" % max(2, junk_run))
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        if input_ids.shape[1] <= self.prompt_length:
+            return done
+
+        start = max(self.prompt_length, input_ids.shape[1] - _WINDOW_TOKENS)
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        for i, (tail, markers) in enumerate(zip(tails, self.markers)):
+            if any(marker in tail for marker in markers) or self.junk.search(tail):
+                done[i] = True
+        return done
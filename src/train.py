@@ -1,13 +1,20 @@
 import os
-from transformers import GPT2LMHeadModel, GPT2Tokenizer, TextDataset, DataCollatorForLanguageModeling
+import time
+from transformers import GPT2LMHeadModel, DataCollatorForLanguageModeling
 from transformers import Trainer, TrainingArguments
+from transformers.trainer_utils import get_last_checkpoint
 from preprocess import load_and_clean_data
+from shards import ShardDataset, build_shards
 
 # Automatically determine paths so you don't have to type them
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "../models")
 
-def train_model(mode):
+def train_model(mode, epochs=3, batch_size=4, grad_accum=1, block_size=128, resume=False):
+    """
+    Fine-tunes distilgpt2 on one mode's data. Returns a stats dict for the
+    training report, or None if there was nothing to train on.
+    """
     print(f"\n==========================================")
     print(f"   STARTING TRAINING: {mode.upper()} MODE")
     print(f"==========================================")
@@ -17,25 +24,17 @@ def train_model(mode):
         texts, tokenizer = load_and_clean_data(mode)
     except Exception as e:
         print(f"❌ Error loading data: {e}")
-        return
+        return None
 
     if not texts:
         print(f"⚠️ No data found for {mode}. Skipping training.")
-        return
+        return None
 
     print(f"📚 Loaded {len(texts)} examples. Preparing to train...")
 
-    # Save texts to a temporary file for the TextDataset loader
-    temp_file = os.path.join(BASE_DIR, f"temp_{mode}.txt")
-    with open(temp_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(texts))
-
-    # 2. Prepare Dataset
-    train_dataset = TextDataset(
-        tokenizer=tokenizer,
-        file_path=temp_file,
-        block_size=128
-    )
+    # 2. Prepare Dataset (token IDs cached by content hash, memory-mapped)
+    # Texts are packed back to back, so every block is full (no padding)
+    train_dataset = ShardDataset(build_shards(mode, texts, tokenizer), block_size=block_size)
     
     data_collator = DataCollatorForLanguageModeling(
         tokenizer=tokenizer, mlm=False
@@ -49,9 +48,9 @@ def train_model(mode):
     
     training_args = TrainingArguments(
         output_dir=output_dir,
-        overwrite_output_dir=True,
-        num_train_epochs=3,              # 3 loops over the data
-        per_device_train_batch_size=4,   # Keep low (4 or 8) to save RAM
+        num_train_epochs=epochs,                   # 3 loops over the data by default
+        per_device_train_batch_size=batch_size,    # Keep low (4 or 8) to save RAM
+        gradient_accumulation_steps=grad_accum,    # Larger effective batch, same RAM
         save_steps=1000,                 # Save model every 1000 steps
         warmup_steps=100,
         logging_steps=50,
@@ -66,20 +65,34 @@ def train_model(mode):
         train_dataset=train_dataset,
     )
 
+    checkpoint = get_last_checkpoint(output_dir) if resume and os.path.isdir(output_dir) else None
+    if checkpoint:
+        print(f"⏯️  Resuming from {checkpoint}")
+
     print(f"🏃 Training started... (This might take a while)")
-    trainer.train()
+    started = time.perf_counter()
+    result = trainer.train(resume_from_checkpoint=checkpoint)
+    seconds = time.perf_counter() - started
     
     # 6. Save the final model
     print(f"💾 Saving model to: {output_dir}")
     trainer.save_model(output_dir)
     tokenizer.save_pretrained(output_dir)
-    
-    # Cleanup temp file
-    if os.path.exists(temp_file):
-        os.remove(temp_file)
         
     print(f"✅ {mode.upper()} Model successfully saved!")
 
+    samples = result.metrics.get("train_samples_per_second", 0.0)
+    return {
+        "mode": mode,
+        "examples": len(texts),
+        "blocks": len(train_dataset),
+        "seconds": round(seconds, 1),
+        "samples_per_s": round(samples, 2),
+        "tokens_per_s": round(samples * block_size, 1),
+        "train_loss": round(result.training_loss, 4),
+        "resumed_from": checkpoint,
+    }
+
 if __name__ == "__main__":
     # Create models folder if it doesn't exist
     if not os.path.exists(MODEL_DIR):
@@ -0,0 +1,118 @@
+"""
+Trains several modes at once as parallel CPU jobs, sized to the machine,
+and writes a per-mode timing/throughput report.
+
+    python src/train_all.py --modes roast relationship therapy --grad-accum 4 --resume
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "../models")
+REPORT_FILE = os.path.join(MODEL_DIR, "training_report.json")
+
+
+def available_ram_gb():
+    """MemAvailable from /proc/meminfo (None where that doesn't exist)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 ** 2
+    except OSError:
+        pass
+    return None
+
+
+def plan_jobs(modes, job_ram_gb, max_jobs=None):
+    """(parallel jobs, torch threads per job) for this machine."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    jobs = min(len(modes), cores)
+    ram = available_ram_gb()
+    if ram is not None and job_ram_gb > 0:
+        jobs = min(jobs, max(1, int(ram // job_ram_gb)))
+    if max_jobs:
+        jobs = min(jobs, max_jobs)
+    jobs = max(1, jobs)
+    return jobs, max(1, cores // jobs), cores, ram
+
+
+def _run_mode(mode, threads, options):
+    """One training job (runs in a worker process)."""
+    import torch
+    torch.set_num_threads(threads)
+
+    from train import train_model
+
+    started = time.perf_counter()
+    try:
+        stats = train_model(mode, **options)
+    except Exception as e:
+        return {"mode": mode, "status": "failed", "error": str(e), "seconds": round(time.perf_counter() - started, 1)}
+    if stats is None:
+        return {"mode": mode, "status": "skipped", "seconds": round(time.perf_counter() - started, 1)}
+    return dict(stats, status="ok", threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["roast", "relationship", "therapy"])
+    parser.add_argument("--epochs", type=float, default=3)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--grad-accum", type=int, default=1, help="Gradient accumulation steps.")
+    parser.add_argument("--block-size", type=int, default=128)
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint of each mode.")
+    parser.add_argument("--job-ram-gb", type=float, default=2.0, help="RAM one training job needs.")
+    parser.add_argument("--max-jobs", type=int, help="Upper bound on parallel jobs.")
+    parser.add_argument("--report", default=REPORT_FILE)
+    args = parser.parse_args()
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    jobs, threads, cores, ram = plan_jobs(args.modes, args.job_ram_gb, args.max_jobs)
+    ram_text = f"{ram:.1f} GB free" if ram is not None else "RAM unknown"
+    print(f"🗓️  {len(args.modes)} modes -> {jobs} parallel job(s) x {threads} thread(s) ({cores} cores, {ram_text})")
+
+    options = {
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+        "grad_accum": args.grad_accum,
+        "block_size": args.block_size,
+        "resume": args.resume,
+    }
+
+    started = time.perf_counter()
+    results = []
+    # spawn: fresh interpreters, no torch thread pools inherited through fork
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(_run_mode, mode, threads, options) for mode in args.modes]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"🏁 {result['mode']}: {result['status']} in {result['seconds']}s")
+
+    report = {
+        "total_seconds": round(time.perf_counter() - started, 1),
+        "parallel_jobs": jobs,
+        "threads_per_job": threads,
+        "options": options,
+        "modes": sorted(results, key=lambda r: args.modes.index(r["mode"])),
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'mode':<13} {'status':<8} {'seconds':>8} {'tokens/s':>9} {'loss':>7}")
+    for r in report["modes"]:
+        print(f"{r['mode']:<13} {r['status']:<8} {r['seconds']:>8} {r.get('tokens_per_s', '-'):>9} {r.get('train_loss', '-'):>7}")
+    print(f"\n📝 Report written to {args.report} (total {report['total_seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+The local prompt is written out twice in src/personas.py (the plain f-string
+and the header/turn split used with history); both must say the same thing.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pytest
+
+from src.personas import local_prompt, local_prompt_prefix, system_instruction
+
+MODES = ("relationship", "roast", "friend", "therapy", "smart", "unknown")
+GENDERS = ("male", "female", "Male", None)
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("gender", GENDERS)
+def test_history_prompt_matches_plain_prompt(mode, gender):
+    plain = local_prompt(mode, gender, "Sam", "hi")
+    # A reply with no message before it is not an exchange: nothing is added
+    assert local_prompt(mode, gender, "Sam", "hi", [("bot", "hello?")]) == plain
+    assert plain.startswith(local_prompt_prefix(mode, gender))
+
+
+def test_history_turns_come_before_the_message():
+    history = [("user", "hey"), ("bot", "hi there"), ("user", "bye"), ("bot", "no")]
+    assert local_prompt("relationship", "male", "Sam", "hi", history) == (
+        "Instruction: Act as Sam's flirty and sweet Girlfriend.\n"
+        "Sam: hey\nGirlfriend: hi there\n"
+        "Sam: bye\nGirlfriend: no\n"
+        "Sam: hi\nGirlfriend:"
+    )
+
+
+@pytest.mark.parametrize("name", [None, 42])
+def test_non_string_names_are_formatted(name):
+    # {"userData": {"name": null}} must not turn into a 500
+    assert f"crush on {name}." in system_instruction("smart", "male", name)
+    assert local_prompt("friend", "male", name, "hi").endswith(f"{name}: hi\nBestie:")
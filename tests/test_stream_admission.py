@@ -0,0 +1,156 @@
+"""
+/predict/stream through asgi.app: streams run side by side on the event
+loop and always give back their admission slot.
+
+    python -m pytest tests
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+os.environ.setdefault("LOCAL_BRAIN_ENABLED", "0")
+
+import pytest
+
+from gemini_stub import start_stub
+
+
+@pytest.fixture
+def app(monkeypatch):
+    import asgi
+    import main
+    from src import gemini_brain
+
+    server, api_base, _ = start_stub()
+    monkeypatch.setattr(gemini_brain, "API_BASE", api_base)
+    monkeypatch.setattr(gemini_brain, "API_KEY", "test")
+    monkeypatch.setattr(main.gemini_gate, "limit", 2)
+    yield asgi.app, main, server
+    server.shutdown()
+
+
+async def _post(app, path, body, disconnect_after=None):
+    data = json.dumps(body).encode()
+    messages = [{"type": "http.request", "body": data}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # No disconnect while the response is sent, unless asked for
+        await asyncio.sleep(3600 if disconnect_after is None else disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("127.0.0.1", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())],
+    }
+    await app(scope, receive, send)
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return status, body.decode()
+
+
+def _reply(text):
+    """The streamed reply: chunk events joined up."""
+    events = [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+    return "".join(event.get("chunk", "") for event in events)
+
+
+def test_stream_releases_gemini_slot(app):
+    asgi_app, main, _ = app
+    body = {"text": "hi", "mode": "smart", "userData": {"name": "Test"}}
+
+    async def run():
+        # More streams than the limit: each one must hand its slot back
+        for _ in range(4):
+            status, text = await _post(asgi_app, "/predict/stream", body)
+            assert status == 200
+            assert '"done": true' in text
+        return await _post(asgi_app, "/predict", body)
+
+    status, _ = asyncio.run(run())
+    assert status == 200
+    assert main.gemini_gate.stats()["in_flight"] == 0
+
+
+def test_streams_overlap(app, monkeypatch):
+    asgi_app, main, server = app
+    server.latency_ms = 500
+    monkeypatch.setattr(main.gemini_gate, "limit", 0)
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            _post(asgi_app, "/predict/stream", {"text": f"hi {n}", "mode": "smart"}) for n in range(8)
+        ))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert all(status == 200 and '"done": true' in text for status, text in results)
+    # One at a time would take 8 x 0.5 s
+    assert elapsed < 1.5
+
+
+class SlowBot:
+    """Stands in for the local brain: blocking, one chunk every 0.1 s."""
+
+    def __init__(self):
+        self.threads = set()
+        self.closed = 0
+
+    def stream(self, text, mode, user_data):
+        try:
+            for word in ("slow", "local", "reply"):
+                self.threads.add(threading.get_ident())
+                time.sleep(0.1)
+                yield word + " "
+        finally:
+            self.closed += 1
+
+
+def test_local_fallback_streams_off_the_loop(app, monkeypatch):
+    asgi_app, main, server = app
+    server.error_rate = 1.0   # every Gemini call fails over to the local brain
+    bot = SlowBot()
+    monkeypatch.setattr(main, "get_local_bot", lambda: bot)
+    monkeypatch.setattr(main.local_gate, "limit", 0)
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            _post(asgi_app, "/predict/stream", {"text": f"hi {n}", "mode": "smart"}) for n in range(4)
+        ))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert all(status == 200 and _reply(text) == "slow local reply " for status, text in results)
+    assert threading.get_ident() not in bot.threads
+    assert elapsed < 4 * 0.3
+    assert bot.closed == 4
+
+
+def test_disconnect_stops_stream_and_releases_slot(app, monkeypatch):
+    asgi_app, main, server = app
+    server.error_rate = 1.0
+    bot = SlowBot()
+    monkeypatch.setattr(main, "get_local_bot", lambda: bot)
+
+    status, text = asyncio.run(
+        _post(asgi_app, "/predict/stream", {"text": "bye", "mode": "smart"}, disconnect_after=0.15))
+    assert status == 200 and '"done"' not in text
+    assert bot.closed == 1
+    assert main.gemini_gate.stats()["in_flight"] == 0
+    assert main.local_gate.stats()["in_flight"] == 0